@@ -0,0 +1,215 @@
+import asyncio
+import json
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+import threading
+
+from fastapi import WebSocket, WebSocketDisconnect
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+
+from .models import SystemLog
+
+
+class Subscriber:
+    """A connected client with its own bounded queue and topic filters.
+
+    When the client falls behind, the oldest events are dropped and the
+    number of dropped events is reported with the next frame so the client
+    can refetch from ``/api/logs`` if it cares.
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue: int = 500,
+                 levels: Optional[Iterable[str]] = None,
+                 profile_ids: Optional[Iterable[int]] = None,
+                 topics: Iterable[str] = ("log",)):
+        self.websocket = websocket
+        self.topics: Set[str] = set(topics)
+        self.queue: deque = deque(maxlen=max_queue)
+        self.dropped = 0
+        self.last_id = 0  # Cursor: highest log id already sent to this client
+        # Ids sent by the connect replay; only these are skipped when they
+        # also arrive live, since log ids are not published in order
+        self.replayed: Set[int] = set()
+        self.wakeup = asyncio.Event()
+        self.set_filters(levels, profile_ids)
+
+    def set_filters(self, levels: Optional[Iterable[str]] = None,
+                    profile_ids: Optional[Iterable[int]] = None):
+        self.levels: Optional[Set[str]] = set(levels) if levels else None
+        self.profile_ids: Optional[Set[int]] = set(profile_ids) if profile_ids else None
+
+    def matches(self, item: Dict) -> bool:
+        if item.get("type") not in self.topics:
+            return False
+        data = item.get("data", {})
+        if self.levels is not None and "level" in data and data["level"] not in self.levels:
+            return False
+        if self.profile_ids is not None and "profile_id" in data and data["profile_id"] not in self.profile_ids:
+            return False
+        return True
+
+    def offer(self, item: Dict):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(item)
+        self.wakeup.set()
+
+    def drain(self, max_items: int) -> List[Dict]:
+        batch = []
+        while self.queue and len(batch) < max_items:
+            item = self.queue.popleft()
+            item_id = item.get("data", {}).get("id")
+            if item_id is not None:
+                if item_id in self.replayed:
+                    self.replayed.discard(item_id)
+                    continue
+                self.last_id = max(self.last_id, item_id)
+            batch.append(item)
+        if not self.queue:
+            self.wakeup.clear()
+        return batch
+
+
+class LogHub:
+    """Fan-out of log events to WebSocket clients.
+
+    ``publish`` may be called from any thread (scraper and webhook threads
+    run in the executor); events are handed to the event loop and queued per
+    client, so a slow client never blocks the producer or other clients.
+    """
+
+    def __init__(self, max_queue: int = 500, max_batch: int = 50,
+                 flush_interval: float = 0.05, send_timeout: float = 10.0,
+                 heartbeat_interval: float = 25.0):
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.send_timeout = send_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.subscribers: List[Subscriber] = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+
+    def attach_loop(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self._loop_thread = threading.get_ident()
+
+    def publish(self, item: Dict):
+        """Queue an event (``{"type": ..., "data": ...}``) for all matching clients"""
+        if self.loop is None or self.loop.is_closed():
+            return
+        if threading.get_ident() == self._loop_thread:
+            self._dispatch(item)
+        else:
+            self.loop.call_soon_threadsafe(self._dispatch, item)
+
+    def _dispatch(self, item: Dict):
+        for subscriber in self.subscribers:
+            if subscriber.matches(item):
+                subscriber.offer(item)
+
+    def subscribe(self, websocket: WebSocket, levels=None, profile_ids=None,
+                  topics: Iterable[str] = ("log",)) -> Subscriber:
+        subscriber = Subscriber(websocket, self.max_queue, levels, profile_ids, topics)
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+
+    async def send_frame(self, subscriber: Subscriber, events: List[Dict], **extra):
+        """Send several events as one frame, with the client's resume cursor"""
+        frame = {"type": "batch", "events": events, "cursor": subscriber.last_id, **extra}
+        if subscriber.dropped:
+            frame["dropped"] = subscriber.dropped
+            subscriber.dropped = 0
+        await asyncio.wait_for(subscriber.websocket.send_json(frame), self.send_timeout)
+
+    async def pump(self, subscriber: Subscriber):
+        """Forward queued events to the client until it disconnects or stalls.
+
+        Idle connections get a ping frame every ``heartbeat_interval`` so dead
+        clients are detected by the failed send and proxies keep the socket open.
+        """
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(subscriber.wakeup.wait(), self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    await asyncio.wait_for(
+                        subscriber.websocket.send_json({"type": "ping", "cursor": subscriber.last_id}),
+                        self.send_timeout
+                    )
+                    continue
+                # Give bursts a moment to accumulate into a single frame
+                await asyncio.sleep(self.flush_interval)
+                events = subscriber.drain(self.max_batch)
+                if events:
+                    await self.send_frame(subscriber, events)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Closed socket or a client too slow to accept a frame in time
+            return
+
+    async def serve(self, subscriber: Subscriber, on_message: Optional[Callable[[Dict], None]] = None):
+        """Stream to the client and read its messages until either side closes"""
+        pump = asyncio.create_task(self.pump(subscriber))
+        try:
+            while not pump.done():
+                receive = asyncio.ensure_future(subscriber.websocket.receive_text())
+                done, _ = await asyncio.wait({receive, pump}, return_when=asyncio.FIRST_COMPLETED)
+                if receive not in done:
+                    receive.cancel()
+                    break
+                text = receive.result()
+                if on_message is None:
+                    continue
+                try:
+                    message = json.loads(text)
+                except ValueError:
+                    continue
+                if isinstance(message, dict):
+                    on_message(message)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            self.unsubscribe(subscriber)
+            pump.cancel()
+
+
+def _serialize_log(log: SystemLog) -> Dict:
+    return {
+        "id": log.id,
+        "level": log.level,
+        "message": log.message,
+        "details": log.details,
+        "profile_id": log.profile_id,
+        "created_at": (log.created_at or datetime.utcnow()).isoformat(),
+    }
+
+
+hub = LogHub()
+
+
+# Every SystemLog insert, from any module or thread, is published once its
+# transaction commits
+@event.listens_for(SystemLog, "after_insert")
+def _collect_log(mapper, connection, target):
+    session = OrmSession.object_session(target)
+    if session is not None:
+        session.info.setdefault("pending_logs", []).append(_serialize_log(target))
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _publish_logs(session):
+    for data in session.info.pop("pending_logs", []):
+        hub.publish({"type": "log", "data": data})
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_logs(session):
+    session.info.pop("pending_logs", None)
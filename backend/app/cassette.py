@@ -0,0 +1,385 @@
+"""Record/replay of Instagram HTTP traffic for offline debugging.
+
+Record the exchanges made while scraping one profile (against a copy of the
+database, so the real profile's cursors and media are left alone)::
+
+    python -m app.cassette record <username> cassettes/<username>.cassette
+
+Replay them offline through ``InstagramScraper.scrape_profile`` against a
+throwaway database and media directory::
+
+    python -m app.cassette replay cassettes/<username>.cassette
+
+Cassettes are gzipped JSON lines: a header with the profile snapshot, the
+user ids of the batched story reels query (and the username of the session,
+if logged in) followed by one line per exchange. Cookies, CSRF/auth headers and token-like values are
+never written. Media bodies are stored as their size only (replayed as
+zero-filled bytes) unless ``--with-media`` is given.
+"""
+import argparse
+import base64
+import gzip
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from urllib3 import HTTPResponse
+
+CASSETTE_VERSION = 1
+
+# Only traffic to these hosts is recorded/replayed; webhooks pass through
+INSTAGRAM_HOSTS = ("instagram.com", "cdninstagram.com", "fbcdn.net")
+
+REDACTED = "REDACTED"
+SENSITIVE_KEYS = {
+    "sessionid", "csrftoken", "csrf_token", "ds_user_id", "access_token",
+    "fb_dtsg", "token", "authorization", "www_claim", "mid", "ig_did", "rur",
+}
+# Response headers worth keeping; ig-set-* values are always redacted
+KEPT_RESPONSE_HEADERS = {"content-type", "content-length"}
+TOKEN_PATTERN = re.compile(
+    r'("(?:%s)"\s*:\s*)"[^"]*"' % "|".join(sorted(SENSITIVE_KEYS)), re.IGNORECASE
+)
+
+
+def _is_instagram_url(url: str) -> bool:
+    host = urlsplit(url).hostname or ""
+    return any(host == h or host.endswith("." + h) for h in INSTAGRAM_HOSTS)
+
+
+def _redact_url(url: str) -> str:
+    parts = urlsplit(url)
+    query = [
+        (key, REDACTED if key.lower() in SENSITIVE_KEYS else value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+    ]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _redact_headers(headers) -> Dict[str, str]:
+    kept = {}
+    for key, value in headers.items():
+        lower = key.lower()
+        if lower.startswith(("ig-set-", "x-ig-set-")):
+            kept[lower] = REDACTED
+        elif lower in KEPT_RESPONSE_HEADERS:
+            kept[lower] = value
+    return kept
+
+
+def _is_media(content_type: str) -> bool:
+    return content_type.startswith(("image/", "video/", "audio/"))
+
+
+def _build_response(request: requests.PreparedRequest, status: int, headers: Dict[str, str],
+                    body: bytes, url: str) -> requests.Response:
+    """Build a Response whose ``raw`` stream can still be read (used by get_raw/write_raw)."""
+    response = requests.Response()
+    response.status_code = status
+    response.headers = requests.structures.CaseInsensitiveDict(headers)
+    response.headers["content-length"] = str(len(body))
+    response.url = url
+    response.request = request
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.raw = HTTPResponse(
+        body=io.BytesIO(body),
+        headers=dict(response.headers),
+        status=status,
+        preload_content=False,
+        decode_content=False,
+    )
+    return response
+
+
+class CassetteMissError(requests.exceptions.ConnectionError):
+    """Raised in replay mode when a request has no recorded response left."""
+
+
+class Cassette:
+    """Patches ``requests.Session.send`` to record or replay Instagram exchanges.
+
+    instaloader copies its session for most queries and uses throwaway
+    sessions for media downloads, so the patch is applied at class level and
+    filtered by host rather than mounted on a single session.
+    """
+
+    def __init__(self, path: Path, mode: str, with_media: bool = False):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Invalid cassette mode: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.with_media = with_media
+        self.header: Dict = {}
+        self.exchanges: List[Dict] = []
+        self._queues: Dict[tuple, deque] = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._original_send = None
+        self.served = 0
+
+    # File format
+
+    def load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as fh:
+            self.header = json.loads(fh.readline())
+            if self.header.get("version") != CASSETTE_VERSION:
+                raise ValueError(f"Unsupported cassette version: {self.header.get('version')}")
+            self.exchanges = [json.loads(line) for line in fh if line.strip()]
+        self._queues.clear()
+        for exchange in self.exchanges:
+            self._queues[(exchange["method"], exchange["url"])].append(exchange)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        header = dict(self.header, version=CASSETTE_VERSION, exchanges=len(self.exchanges))
+        with gzip.open(self.path, "wt", encoding="utf-8") as fh:
+            fh.write(json.dumps(header, default=str) + "\n")
+            for exchange in self.exchanges:
+                fh.write(json.dumps(exchange, separators=(",", ":")) + "\n")
+
+    # Patching
+
+    def __enter__(self):
+        if self.mode == "replay" and not self.exchanges:
+            self.load()
+        self._original_send = requests.Session.send
+        cassette = self
+
+        def send(session, request, **kwargs):
+            if not _is_instagram_url(request.url):
+                return cassette._original_send(session, request, **kwargs)
+            if cassette.mode == "record":
+                return cassette._record(session, request, **kwargs)
+            return cassette._replay(request)
+
+        requests.Session.send = send
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        requests.Session.send = self._original_send
+        if self.mode == "record":
+            self.save()
+        return False
+
+    def _record(self, session, request, **kwargs) -> requests.Response:
+        started = time.perf_counter()
+        response = self._original_send(session, request, **kwargs)
+        body = response.content  # Consumes the stream; rebuilt below
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        headers = _redact_headers(response.headers)
+        exchange = {
+            "method": request.method,
+            "url": _redact_url(request.url),
+            "status": response.status_code,
+            "headers": headers,
+            "elapsed_ms": elapsed_ms,
+        }
+        content_type = headers.get("content-type", "")
+        if _is_media(content_type) and not self.with_media:
+            exchange["body_size"] = len(body)
+        else:
+            try:
+                exchange["body"] = TOKEN_PATTERN.sub(r'\1"%s"' % REDACTED, body.decode("utf-8"))
+            except UnicodeDecodeError:
+                exchange["body_b64"] = base64.b64encode(body).decode("ascii")
+        with self._lock:
+            self.exchanges.append(exchange)
+
+        # Hand back an equivalent response whose raw stream is still readable
+        raw_headers = {k: v for k, v in response.headers.items() if k.lower() != "content-encoding"}
+        replayed = _build_response(request, response.status_code, raw_headers, body, response.url)
+        replayed.cookies = response.cookies
+        replayed.elapsed = response.elapsed
+        return replayed
+
+    def _replay(self, request) -> requests.Response:
+        key = (request.method, _redact_url(request.url))
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                raise CassetteMissError(f"No recorded response for {key[0]} {key[1]}")
+            exchange = queue.popleft()
+            self.served += 1
+
+        if "body_b64" in exchange:
+            body = base64.b64decode(exchange["body_b64"])
+        elif "body" in exchange:
+            body = exchange["body"].encode("utf-8")
+        else:
+            body = bytes(exchange.get("body_size", 0))
+        return _build_response(request, exchange["status"], exchange["headers"], body, request.url)
+
+
+def _profile_snapshot(profile) -> Dict:
+    return {
+        "username": profile.username,
+        "download_posts": profile.download_posts,
+        "download_stories": profile.download_stories,
+        "last_post_timestamp": profile.last_post_timestamp.isoformat() if profile.last_post_timestamp else None,
+        "last_story_timestamp": profile.last_story_timestamp.isoformat() if profile.last_story_timestamp else None,
+        # Part of the post cursor and the batched stories check
+        "recent_post_shortcodes": profile.recent_post_shortcodes,
+        "instagram_userid": profile.instagram_userid,
+    }
+
+
+def _copy_database(workdir: Path) -> Path:
+    """Snapshot the app database (accounts, profiles, cursors) into ``workdir``"""
+    source = Path(os.getenv("DATABASE_PATH", Path(__file__).parent.parent / "database.db"))
+    target = workdir / "record.db"
+    with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+        src.backup(dst)
+    return target
+
+
+def record(username: str, path: Path, with_media: bool = False, workdir: Optional[Path] = None) -> Dict:
+    """Scrape one profile for real and write its Instagram traffic to a cassette.
+
+    The scrape runs against a copy of the database and a scratch media
+    directory: it moves cursors and stores posts it never delivers, which
+    must not happen to the real profile.
+    """
+    workdir = Path(workdir or tempfile.mkdtemp(prefix="cassette-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    # Must be set before the app modules create their engine
+    os.environ["DATABASE_PATH"] = str(_copy_database(workdir))
+
+    from sqlmodel import Session, select
+    from .database import create_db_and_tables, engine
+    from .models import Profile
+    from .scraper import InstagramScraper
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        profile = session.exec(select(Profile).where(Profile.username == username)).first()
+        if not profile:
+            raise SystemExit(f"Profile @{username} not found")
+        profile_id = profile.id
+        snapshot = _profile_snapshot(profile)
+
+    scraper = InstagramScraper()
+    scraper.media_dir = workdir / "media"
+    scraper.media_dir.mkdir(exist_ok=True)
+    cassette = Cassette(path, "record", with_media=with_media)
+    cassette.header = {"profile": snapshot, "recorded_at": datetime.utcnow().isoformat()}
+    if scraper.loader.context.is_logged_in:
+        # Only who was logged in, so replay takes the same login-only paths
+        cassette.header["login"] = {
+            "username": scraper.loader.context.username,
+            "user_id": scraper.loader.context.user_id,
+        }
+
+    started = time.perf_counter()
+    with cassette:
+        new_media = scraper.scrape_profile(profile_id)
+        # The batched reels query asks for every story profile in the
+        # database; replay needs the same users to build the same URL
+        cassette.header["story_reel_userids"] = sorted(scraper._story_reels_userids)
+    return {
+        "exchanges": len(cassette.exchanges),
+        "new_media": len(new_media),
+        "elapsed_s": round(time.perf_counter() - started, 3),
+        "workdir": str(workdir),
+    }
+
+
+def replay(path: Path, workdir: Optional[Path] = None) -> Dict:
+    """Replay a cassette through ``scrape_profile`` with no network access.
+
+    Uses a scratch database and media directory so repeated replays are
+    deterministic and never touch production data.
+    """
+    workdir = Path(workdir or tempfile.mkdtemp(prefix="cassette-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    # Must be set before the app modules create their engine
+    os.environ["DATABASE_PATH"] = str(workdir / "replay.db")
+
+    from sqlmodel import Session
+    from .database import create_db_and_tables, engine
+    from .models import Profile
+    from .scraper import InstagramScraper
+
+    cassette = Cassette(path, "replay")
+    cassette.load()
+    snapshot = dict(cassette.header["profile"])
+    for field in ("last_post_timestamp", "last_story_timestamp"):
+        if snapshot[field]:
+            snapshot[field] = datetime.fromisoformat(snapshot[field])
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        profile = Profile(webhook_url="http://localhost/replay", **snapshot)
+        session.add(profile)
+        # Stand-ins for the other story profiles of the recording database
+        for userid in cassette.header.get("story_reel_userids", []):
+            if userid != snapshot.get("instagram_userid"):
+                session.add(Profile(username=f"reel-{userid}", webhook_url="", instagram_userid=userid,
+                                    download_posts=False, download_stories=True))
+        session.commit()
+        profile_id = profile.id
+
+    with cassette:
+        scraper = InstagramScraper()
+        scraper.media_dir = workdir / "media"
+        scraper.media_dir.mkdir(exist_ok=True)
+        # No random or rate-limit sleeps: replay timing must reflect our code only
+        scraper.loader.context.sleep = False
+        scraper.loader.context._rate_controller.sleep = lambda secs: None
+        login = cassette.header.get("login")
+        if login:
+            # Replayed responses need no cookies; the username alone makes
+            # instaloader consider the context logged in (e.g. for stories)
+            scraper.loader.context.username = login["username"]
+            scraper.loader.context.user_id = login.get("user_id")
+
+        started = time.perf_counter()
+        new_media = scraper.scrape_profile(profile_id)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "exchanges": len(cassette.exchanges),
+        "served": cassette.served,
+        "new_media": len(new_media),
+        "elapsed_s": round(elapsed, 3),
+        "recorded_network_s": round(sum(e.get("elapsed_ms", 0) for e in cassette.exchanges) / 1000, 3),
+        "workdir": str(workdir),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.cassette", description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="Scrape a profile and record its traffic")
+    record_parser.add_argument("username")
+    record_parser.add_argument("path", type=Path)
+    record_parser.add_argument("--with-media", action="store_true", help="Store media bodies too")
+    record_parser.add_argument("--workdir", type=Path, default=None)
+
+    replay_parser = subparsers.add_parser("replay", help="Replay a cassette offline")
+    replay_parser.add_argument("path", type=Path)
+    replay_parser.add_argument("--workdir", type=Path, default=None)
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        result = record(args.username, args.path, with_media=args.with_media, workdir=args.workdir)
+    else:
+        result = replay(args.path, workdir=args.workdir)
+    json.dump(result, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,192 @@
-from sqlmodel import create_engine, SQLModel, Session
+from sqlmodel import create_engine, SQLModel, Session as SQLModelSession
+from sqlalchemy import event, inspect, text
 from pathlib import Path
+import os
+
+from .models import LogRollup, ScrapeRun, SystemLog
 
 # Create database directory if it doesn't exist
-db_path = Path(__file__).parent.parent / "database.db"
+db_path = Path(os.getenv("DATABASE_PATH", Path(__file__).parent.parent / "database.db"))
 db_path.parent.mkdir(exist_ok=True)
 
 sqlite_url = f"sqlite:///{db_path}"
 connect_args = {"check_same_thread": False}
 engine = create_engine(sqlite_url, connect_args=connect_args)
 
+# Logs and telemetry live in their own file, so bursts of log writes never
+# hold the write lock the scraper needs for profiles and media
+logs_db_path = Path(os.getenv("LOGS_DATABASE_PATH", db_path.with_name(f"{db_path.stem}-logs.db")))
+logs_engine = create_engine(f"sqlite:///{logs_db_path}", connect_args=connect_args)
+LOG_MODELS = (SystemLog, LogRollup, ScrapeRun)
+LOG_TABLES = [model.__table__ for model in LOG_MODELS]
+
+
+@event.listens_for(logs_engine, "connect")
+def _attach_core_db(dbapi_connection, connection_record):
+    # Core tables are readable as core.<table> (or unqualified) for cross-queries
+    dbapi_connection.execute("ATTACH DATABASE ? AS core", (str(db_path),))
+
+
+class Session(SQLModelSession):
+    """SQLModel session that sends log models to ``logs_engine``.
+
+    Use it like ``Session(engine)``; everything else goes to the bind given.
+    """
+    
+    def __init__(self, bind=None, **kwargs):
+        kwargs.setdefault("binds", {model: logs_engine for model in LOG_MODELS})
+        super().__init__(bind=bind, **kwargs)
+
+
+def _sql_literal(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _add_missing_columns(db_engine, tables):
+    """Add columns introduced after a table was created.
+
+    ``create_all`` never alters existing tables, so new model fields are added
+    here with ALTER TABLE (nullable, or with their scalar default).
+    """
+    inspector = inspect(db_engine)
+    with db_engine.begin() as conn:
+        for table in tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(db_engine.dialect)}'
+                default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                if default is not None:
+                    ddl += f" NOT NULL DEFAULT {_sql_literal(default)}"
+                conn.execute(text(ddl))
+
+
+# Full-text index over captions and usernames (rowid = post.id), kept in
+# sync by triggers so every writer updates it in the same transaction
+_SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS media_fts USING fts5(
+        caption, username, tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS post_fts_insert AFTER INSERT ON post BEGIN
+        INSERT INTO media_fts (rowid, caption, username)
+        VALUES (new.id, coalesce(new.caption, ''),
+                coalesce((SELECT username FROM profile WHERE id = new.profile_id), ''));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS post_fts_update AFTER UPDATE OF caption ON post BEGIN
+        UPDATE media_fts SET caption = coalesce(new.caption, '') WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS post_fts_delete AFTER DELETE ON post BEGIN
+        DELETE FROM media_fts WHERE rowid = old.id;
+    END""",
+]
+
+
+def _create_search_index():
+    """Create the FTS5 caption index, filling it from existing rows the first time"""
+    with engine.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'media_fts'"
+        )).first()
+        for ddl in _SEARCH_INDEX_DDL:
+            conn.execute(text(ddl))
+        if not exists:
+            conn.execute(text(
+                "INSERT INTO media_fts (rowid, caption, username) "
+                "SELECT m.id, coalesce(m.caption, ''), coalesce(p.username, '') "
+                "FROM post m LEFT JOIN profile p ON p.id = m.profile_id"
+            ))
+
+
+def _add_missing_indexes(db_engine, tables):
+    """Create indexes added to tables that already existed"""
+    for table in tables:
+        for index in table.indexes:
+            index.create(db_engine, checkfirst=True)
+
+
+def _seed_destinations():
+    """Turn each profile's webhook_url and telegram_chat_id into destinations"""
+    with engine.begin() as conn:
+        profiles = conn.execute(text("SELECT id, webhook_url, telegram_chat_id FROM profile")).all()
+        for profile_id, webhook_url, telegram_chat_id in profiles:
+            targets = [("webhook", webhook_url)] if webhook_url else []
+            targets += [("telegram", c.strip()) for c in (telegram_chat_id or "").split(",") if c.strip()]
+            for kind, target in targets:
+                conn.execute(text(
+                    "INSERT INTO destination (profile_id, kind, target, is_active, sent_count, failed_count, created_at) "
+                    "VALUES (:profile_id, :kind, :target, 1, 0, 0, CURRENT_TIMESTAMP)"
+                ), {"profile_id": profile_id, "kind": kind, "target": target})
+
+
+def _migrate_media_log():
+    """Split the old one-row-per-file medialog table into post + mediaitem, once.
+
+    Files keep their medialog ids; the caption index built on medialog is
+    dropped so ``_create_search_index`` rebuilds it over posts.
+    """
+    if not inspect(engine).has_table("medialog"):
+        return
+    with engine.begin() as conn:
+        # SQLite takes the bare columns from the row holding min(timestamp)
+        conn.execute(text(
+            "INSERT INTO post (profile_id, media_type, instagram_id, caption, timestamp, created_at) "
+            "SELECT profile_id, media_type, instagram_id, caption, min(timestamp), created_at "
+            "FROM medialog GROUP BY instagram_id"
+        ))
+        conn.execute(text(
+            "INSERT INTO mediaitem (id, post_id, media_path, file_type, webhook_sent, sent_at, created_at) "
+            "SELECT m.id, p.id, m.media_path, "
+            "CASE WHEN lower(m.media_path) LIKE '%.mp4' THEN 'video' ELSE 'image' END, "
+            "m.webhook_sent, m.sent_at, m.created_at "
+            "FROM medialog m JOIN post p ON p.instagram_id = m.instagram_id"
+        ))
+        for trigger in ("medialog_fts_insert", "medialog_fts_update", "medialog_fts_delete"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        conn.execute(text("DROP TABLE IF EXISTS media_fts"))
+        conn.execute(text("DROP TABLE medialog"))
+
+
+def _move_log_tables():
+    """Move log tables still in the core database into the logs database, once"""
+    core_tables = inspect(engine).get_table_names()
+    with logs_engine.begin() as conn:
+        for table in LOG_TABLES:
+            if table.name not in core_tables:
+                continue
+            columns = ", ".join(f'"{column.name}"' for column in table.columns)
+            conn.execute(text(
+                f'INSERT INTO main."{table.name}" ({columns}) SELECT {columns} FROM core."{table.name}"'
+            ))
+            conn.execute(text(f'DROP TABLE core."{table.name}"'))
+
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    core_tables = [table for table in SQLModel.metadata.sorted_tables if table not in LOG_TABLES]
+    for db_engine in (engine, logs_engine):
+        with db_engine.connect() as conn:
+            # Only takes effect on a new, empty database; retention.py converts older ones
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+    new_destinations = not inspect(engine).has_table("destination")
+    SQLModel.metadata.create_all(engine, tables=core_tables)
+    SQLModel.metadata.create_all(logs_engine, tables=LOG_TABLES)
+    _add_missing_columns(engine, core_tables)
+    _add_missing_columns(logs_engine, LOG_TABLES)
+    _add_missing_indexes(engine, core_tables)
+    _add_missing_indexes(logs_engine, LOG_TABLES)
+    _move_log_tables()
+    _migrate_media_log()
+    _create_search_index()
+    if new_destinations:
+        _seed_destinations()
 
 
 def get_session():
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
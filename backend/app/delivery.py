@@ -0,0 +1,154 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import update
+from sqlmodel import select
+from .models import Destination, MediaItem, Profile, SystemLog
+from .database import Session, engine
+from .webhook import WebhookSender
+from .telegram import TelegramManager, group_media
+from .stats import stats_tracker
+import asyncio
+import os
+import time
+
+DELIVERY_MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", "3"))
+DELIVERY_RETRY_DELAY = float(os.getenv("DELIVERY_RETRY_DELAY", "5"))  # seconds, doubled per attempt
+# Delivery threads per scheduler lane: critical profiles' deliveries never
+# wait behind standard ones sleeping in retry backoff
+DELIVERY_LANE_WORKERS = int(os.getenv("DELIVERY_LANE_WORKERS", "4"))
+
+
+class DeliveryManager:
+    """Fans a scrape's new media out to all of a profile's destinations.
+
+    Each destination is delivered concurrently in its own executor thread,
+    retries only the items that failed, and records its own status, counts
+    and latency, so a slow or broken webhook never holds up the others. Sent
+    status is written once per destination run, in a single UPDATE over the
+    delivered MediaItem ids. Each scheduler lane has its own thread pool.
+    """
+    
+    def __init__(self, base_url: str):
+        self.webhook_sender = WebhookSender(base_url)
+        self.telegram_manager = TelegramManager()
+        self.executors = {
+            lane: ThreadPoolExecutor(DELIVERY_LANE_WORKERS, thread_name_prefix=f"delivery-{lane}")
+            for lane in ("critical", "standard")
+        }
+    
+    def shutdown(self):
+        for executor in self.executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _load_destinations(self, profile_id: int) -> Tuple[Optional[str], List[Dict]]:
+        with Session(engine) as session:
+            profile = session.get(Profile, profile_id)
+            if not profile:
+                return None, []
+            destinations = session.exec(
+                select(Destination).where(Destination.profile_id == profile_id, Destination.is_active == True)
+            ).all()
+            return profile.username, [
+                {"id": d.id, "kind": d.kind, "target": d.target, "variant": d.variant} for d in destinations
+            ]
+    
+    async def deliver(self, profile_id: int, new_media: list, lane: str = "standard"):
+        loop = asyncio.get_event_loop()
+        executor = self.executors[lane]
+        username, destinations = await loop.run_in_executor(executor, self._load_destinations, profile_id)
+        if not destinations:
+            return
+        results = await asyncio.gather(*(
+            loop.run_in_executor(executor, self._deliver_to, destination, new_media, username)
+            for destination in destinations
+        ))
+        for sent, failed in results:
+            stats_tracker.profile_delivered(profile_id, sent, failed)
+    
+    @staticmethod
+    def _with_variant(item: Dict, variant: Optional[str]) -> Dict:
+        """The item as a destination wants it: images swap to the variant file,
+        videos keep the original and get the variant as ``poster_path``"""
+        path = item.get("variants", {}).get(variant) if variant else None
+        if not path:
+            return item
+        if item["media_type"] == "video":
+            return {**item, "poster_path": path, "variant": variant}
+        return {**item, "media_path": path, "variant": variant}
+    
+    def _send(self, destination: Dict, group: List[Dict], username: str) -> bool:
+        group = [self._with_variant(item, destination.get("variant")) for item in group]
+        if destination["kind"] == "telegram":
+            return self.telegram_manager.send_group(destination["target"], group)
+        return self.webhook_sender.send_media(destination["target"], group[0], username)
+    
+    def _deliver_to(self, destination: Dict, new_media: list, username: str) -> Tuple[int, int]:
+        """Deliver to one destination with retries; returns (sent, failed) item counts"""
+        if destination["kind"] == "telegram":
+            pending = group_media(new_media)
+        else:
+            pending = [[item] for item in new_media]
+        
+        sent_ids = []
+        latencies = []
+        for attempt in range(1, DELIVERY_MAX_ATTEMPTS + 1):
+            if attempt > 1:
+                time.sleep(DELIVERY_RETRY_DELAY * 2 ** (attempt - 2))
+            failed_groups = []
+            for group in pending:
+                started = time.monotonic()
+                ok = self._send(destination, group, username)
+                latencies.append(time.monotonic() - started)
+                if ok:
+                    sent_ids.extend(item["id"] for item in group if item.get("id"))
+                else:
+                    failed_groups.append(group)
+            pending = failed_groups
+            if not pending:
+                break
+        
+        sent = len(new_media) - sum(len(group) for group in pending)
+        failed = len(new_media) - sent
+        error = None
+        if failed:
+            error = f"{failed} item(s) failed after {DELIVERY_MAX_ATTEMPTS} attempts"
+        self._record(destination, sent_ids, sent, failed, latencies, error)
+        return sent, failed
+    
+    def _record(self, destination: Dict, sent_ids: List[int], sent: int, failed: int,
+                latencies: List[float], error: Optional[str]):
+        with Session(engine) as session:
+            if sent_ids:
+                session.execute(
+                    update(MediaItem)
+                    .where(MediaItem.id.in_(sent_ids))
+                    .values(webhook_sent=True, sent_at=datetime.utcnow())
+                )
+            row = session.get(Destination, destination["id"])
+            if not row:
+                session.commit()
+                return
+            row.last_status = "ok" if not failed else "partial" if sent else "failed"
+            row.last_error = error
+            if latencies:
+                row.last_latency_ms = int(sum(latencies) / len(latencies) * 1000)
+            row.last_delivery_at = datetime.utcnow()
+            row.sent_count += sent
+            row.failed_count += failed
+            session.add(row)
+            if sent:
+                session.add(SystemLog(
+                    level="info",
+                    message=f"{sent} item(s) entregue(s) ao destino {destination['kind']}",
+                    details=f"Destino: {destination['target'][:50]}",
+                    profile_id=row.profile_id
+                ))
+            if failed:
+                session.add(SystemLog(
+                    level="warning",
+                    message=f"Entrega incompleta para destino {destination['kind']}",
+                    details=f"Destino: {destination['target'][:50]}, {error}",
+                    profile_id=row.profile_id
+                ))
+            session.commit()
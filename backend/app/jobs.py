@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import os
+import threading
+import uuid
+
+
+class Job:
+    """A unit of background work with progress steps.
+
+    ``steps`` uses the same structure the test endpoints always returned
+    (``{"step", "status", "details", "timestamp"}``), so callers can append
+    to it directly while the job runs.
+    """
+
+    def __init__(self, kind: str, key: Any):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.key = key
+        self.status = "queued"  # "queued", "running", "completed", "failed"
+        self.steps: List[Dict] = []
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def add_step(self, step: str, status: str, details: Optional[str] = None):
+        entry = {"step": step, "status": status, "timestamp": datetime.utcnow().isoformat()}
+        if details is not None:
+            entry["details"] = details
+        self.steps.append(entry)
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "steps": list(self.steps),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class JobRunner:
+    """Runs jobs on a bounded thread pool, one active job per (kind, key).
+
+    Submitting while a job for the same key is queued or running returns the
+    existing job, so repeated clicks never hit Instagram in parallel.
+    """
+
+    def __init__(self, max_workers: int = 2, keep_finished: int = 200):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.keep_finished = keep_finished
+        self.jobs: Dict[str, Job] = {}
+        self.active: Dict[Tuple[str, Any], Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, key: Any, func: Callable, *args) -> Tuple[Job, bool]:
+        """Queue ``func(job, *args)``; returns (job, created)"""
+        with self._lock:
+            existing = self.active.get((kind, key))
+            if existing:
+                return existing, False
+            job = Job(kind, key)
+            self.jobs[job.id] = job
+            self.active[(kind, key)] = job
+            self._prune()
+        self.executor.submit(self._run, job, func, args)
+        return job, True
+
+    def _run(self, job: Job, func: Callable, args: tuple):
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        try:
+            job.result = func(job, *args)
+            job.status = "completed"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.utcnow()
+            with self._lock:
+                if self.active.get((job.kind, job.key)) is job:
+                    del self.active[(job.kind, job.key)]
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond ``keep_finished``"""
+        finished = [job for job in self.jobs.values() if job.done]
+        for job in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[job.id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        return sorted(self.jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+job_runner = JobRunner(max_workers=int(os.getenv("JOB_WORKERS", "2")))
@@ -1,22 +1,31 @@
-from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import Session, select
+from fastapi.concurrency import run_in_threadpool
+from anyio import to_thread
+from sqlmodel import select
+from sqlalchemy import case, func, tuple_
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 from pathlib import Path
 import asyncio
 import json
-from passlib.context import CryptContext
 
-from .database import create_db_and_tables, get_session, engine
+from .database import Session, create_db_and_tables, get_session, engine
 from .models import (
     Profile, ProfileCreate, ProfileUpdate, ProfileResponse,
-    SystemLog, LogResponse, StatsResponse, MediaLog,
-    InstagramAccount, InstagramAccountCreate, InstagramAccountUpdate, InstagramAccountResponse
+    SystemLog, LogResponse, LogRollup, LogRollupResponse, StatsResponse, Post, MediaItem, ScrapeRun, SloStats,
+    InstagramAccount, InstagramAccountCreate, InstagramAccountUpdate, InstagramAccountResponse,
+    BackfillState, BackfillResponse, MediaResponse, MediaPage, MediaSummary,
+    Destination, DestinationCreate, DestinationUpdate, DestinationResponse
 )
-from .scheduler import TaskScheduler, get_scraper
+from .scheduler import TaskScheduler, get_scraper, scraper_state, warm_scraper
+from .broadcast import hub as log_hub
+from .stats import stats_tracker
+from .jobs import Job, job_runner
+from .search import search_media
 
 # Initialize FastAPI app
 app = FastAPI(title="Instagram to Telegram Bot", version="1.0.0")
@@ -50,22 +59,59 @@ BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
 # Initialize scheduler
 scheduler = TaskScheduler(BASE_URL)
 
-# WebSocket connections for real-time logs
-websocket_connections: List[WebSocket] = []
+# Maximum number of missed logs replayed to a reconnecting WebSocket client
+WS_REPLAY_LIMIT = 500
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Size of the worker pool running sync handlers (DB access, bcrypt, Instagram calls)
+API_THREADS = int(os.getenv("API_THREADS", "40"))
+
+# Password hashing (passlib is imported on first use)
+_pwd_context = None
+
+def get_pwd_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
+# Database migrations, counters and scheduler; reported by /ready
+startup_state = {"status": "pending", "error": None}  # "pending", "ready", "failed"
+_startup_task: Optional[asyncio.Task] = None
+
+
+async def _initialize():
+    """Bring the database and scheduler up after the server accepts connections"""
+    loop = asyncio.get_running_loop()
+    try:
+        await run_in_threadpool(create_db_and_tables)
+        await run_in_threadpool(stats_tracker.load)
+        await scheduler.start()
+    except Exception as e:
+        startup_state.update(status="failed", error=str(e))
+        raise  # Also reported by asyncio in the server log
+    startup_state["status"] = "ready"
+    # The Instagram session (file load and a test login over the network) is
+    # warmed in the background as well
+    loop.run_in_executor(None, warm_scraper)
 
 
 @app.on_event("startup")
 async def startup_event():
-    create_db_and_tables()
-    scheduler.start()
+    global _startup_task
+    log_hub.attach_loop(asyncio.get_running_loop())
+    to_thread.current_default_thread_limiter().total_tokens = API_THREADS
+    # Uvicorn only accepts connections once this hook returns, and migrating
+    # a large database can take minutes: /health must answer meanwhile
+    _startup_task = asyncio.create_task(_initialize())
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    if _startup_task and not _startup_task.done():
+        _startup_task.cancel()
     scheduler.stop()
+    job_runner.shutdown()
 
 
 # Mount static files for media serving
@@ -74,8 +120,31 @@ app.mount("/media", StaticFiles(directory=str(media_path)), name="media")
 
 
 # Profile endpoints
+def _split_chat_ids(value: Optional[str]) -> List[str]:
+    return [c.strip() for c in (value or "").split(",") if c.strip()]
+
+
+def _replace_destinations(session: Session, profile_id: int, kind: str, old: List[str], new: List[str]):
+    """Keep destinations in step with the profile's webhook_url/telegram_chat_id.
+
+    Only destinations matching the previous value are replaced, so ones added
+    through /api/profiles/{id}/destinations are left alone.
+    """
+    for destination in session.exec(
+        select(Destination).where(Destination.profile_id == profile_id, Destination.kind == kind)
+    ).all():
+        if destination.target in old and destination.target not in new:
+            session.delete(destination)
+    existing = set(session.exec(
+        select(Destination.target).where(Destination.profile_id == profile_id, Destination.kind == kind)
+    ).all())
+    for target in new:
+        if target not in existing:
+            session.add(Destination(profile_id=profile_id, kind=kind, target=target))
+
+
 @app.post("/api/profiles", response_model=ProfileResponse)
-async def create_profile(
+def create_profile(
     profile: ProfileCreate,
     session: Session = Depends(get_session)
 ):
@@ -88,10 +157,19 @@ async def create_profile(
     
     # Create new profile
     db_profile = Profile.model_validate(profile)
+    if profile.history in ("now", "full"):
+        # Live polling only looks for posts published from now on
+        db_profile.last_post_timestamp = datetime.utcnow()
     session.add(db_profile)
     session.commit()
     session.refresh(db_profile)
     
+    if profile.history == "full":
+        session.add(BackfillState(profile_id=db_profile.id))
+    _replace_destinations(session, db_profile.id, "webhook", [], [db_profile.webhook_url] if db_profile.webhook_url else [])
+    _replace_destinations(session, db_profile.id, "telegram", [], _split_chat_ids(db_profile.telegram_chat_id))
+    session.commit()
+    
     # Add to scheduler
     scheduler.add_profile_job(db_profile.id, db_profile.check_interval)
     
@@ -104,17 +182,11 @@ async def create_profile(
     session.add(log_entry)
     session.commit()
     
-    # Notify websockets
-    await notify_websockets({
-        "type": "log",
-        "data": LogResponse.model_validate(log_entry).model_dump()
-    })
-    
     return db_profile
 
 
 @app.get("/api/profiles", response_model=List[ProfileResponse])
-async def list_profiles(
+def list_profiles(
     session: Session = Depends(get_session),
     active_only: bool = False
 ):
@@ -127,7 +199,7 @@ async def list_profiles(
 
 
 @app.get("/api/profiles/{profile_id}", response_model=ProfileResponse)
-async def get_profile(
+def get_profile(
     profile_id: int,
     session: Session = Depends(get_session)
 ):
@@ -138,7 +210,7 @@ async def get_profile(
 
 
 @app.put("/api/profiles/{profile_id}", response_model=ProfileResponse)
-async def update_profile(
+def update_profile(
     profile_id: int,
     profile_update: ProfileUpdate,
     session: Session = Depends(get_session)
@@ -149,6 +221,12 @@ async def update_profile(
     
     # Update fields
     update_data = profile_update.model_dump(exclude_unset=True)
+    if "webhook_url" in update_data:
+        _replace_destinations(session, profile_id, "webhook",
+                              [profile.webhook_url], [update_data["webhook_url"]] if update_data["webhook_url"] else [])
+    if "telegram_chat_id" in update_data:
+        _replace_destinations(session, profile_id, "telegram",
+                              _split_chat_ids(profile.telegram_chat_id), _split_chat_ids(update_data["telegram_chat_id"]))
     for field, value in update_data.items():
         setattr(profile, field, value)
     
@@ -158,7 +236,7 @@ async def update_profile(
     session.refresh(profile)
     
     # Update scheduler if needed
-    if "check_interval" in update_data or "is_active" in update_data:
+    if update_data.keys() & {"check_interval", "priority", "slo_minutes", "is_active"}:
         if profile.is_active:
             scheduler.add_profile_job(profile.id, profile.check_interval)
         else:
@@ -168,7 +246,7 @@ async def update_profile(
 
 
 @app.delete("/api/profiles/{profile_id}")
-async def delete_profile(
+def delete_profile(
     profile_id: int,
     session: Session = Depends(get_session)
 ):
@@ -180,59 +258,168 @@ async def delete_profile(
     scheduler.remove_profile_job(profile_id)
     
     # Delete profile
+    backfill = session.get(BackfillState, profile_id)
+    if backfill:
+        session.delete(backfill)
+    for destination in session.exec(select(Destination).where(Destination.profile_id == profile_id)).all():
+        session.delete(destination)
     session.delete(profile)
     session.commit()
     
     return {"message": "Profile deleted successfully"}
 
 
-# Operations endpoints
-@app.post("/api/check/{profile_id}")
-async def force_check(
+# Destination endpoints
+@app.get("/api/profiles/{profile_id}/destinations", response_model=List[DestinationResponse])
+def list_destinations(profile_id: int, session: Session = Depends(get_session)):
+    """Delivery destinations of a profile, with the outcome of their latest delivery"""
+    if not session.get(Profile, profile_id):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return session.exec(select(Destination).where(Destination.profile_id == profile_id)).all()
+
+
+@app.post("/api/profiles/{profile_id}/destinations", response_model=DestinationResponse)
+def create_destination(
     profile_id: int,
+    destination: DestinationCreate,
     session: Session = Depends(get_session)
 ):
-    profile = session.get(Profile, profile_id)
-    if not profile:
+    if not session.get(Profile, profile_id):
         raise HTTPException(status_code=404, detail="Profile not found")
+    existing = session.exec(
+        select(Destination).where(
+            Destination.profile_id == profile_id,
+            Destination.kind == destination.kind,
+            Destination.target == destination.target
+        )
+    ).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="Destination already exists")
     
-    if not profile.is_active:
-        raise HTTPException(status_code=400, detail="Profile is not active")
-    
-    # Run check asynchronously
-    asyncio.create_task(scheduler.force_check(profile_id))
-    
-    # Log
-    log_entry = SystemLog(
-        level="info",
-        message=f"Manual check triggered for @{profile.username}",
-        profile_id=profile_id
-    )
-    session.add(log_entry)
+    db_destination = Destination(profile_id=profile_id, **destination.model_dump())
+    session.add(db_destination)
     session.commit()
-    
-    # Notify websockets
-    await notify_websockets({
-        "type": "log",
-        "data": LogResponse.model_validate(log_entry).model_dump()
-    })
-    
-    return {"message": "Check started"}
+    session.refresh(db_destination)
+    return db_destination
+
+
+@app.put("/api/destinations/{destination_id}", response_model=DestinationResponse)
+def update_destination(
+    destination_id: int,
+    update: DestinationUpdate,
+    session: Session = Depends(get_session)
+):
+    destination = session.get(Destination, destination_id)
+    if not destination:
+        raise HTTPException(status_code=404, detail="Destination not found")
+    for field, value in update.model_dump(exclude_unset=True).items():
+        setattr(destination, field, value)
+    session.add(destination)
+    session.commit()
+    session.refresh(destination)
+    return destination
+
+
+@app.delete("/api/destinations/{destination_id}")
+def delete_destination(destination_id: int, session: Session = Depends(get_session)):
+    destination = session.get(Destination, destination_id)
+    if not destination:
+        raise HTTPException(status_code=404, detail="Destination not found")
+    session.delete(destination)
+    session.commit()
+    return {"message": "Destination deleted"}
 
 
-@app.post("/api/test/{profile_id}")
-async def test_scraping(
+@app.get("/api/profiles/{profile_id}/backfill", response_model=BackfillResponse)
+def get_backfill(
     profile_id: int,
     session: Session = Depends(get_session)
 ):
-    """Test scraping for a profile with detailed logs"""
+    state = session.get(BackfillState, profile_id)
+    if not state:
+        raise HTTPException(status_code=404, detail="No backfill for this profile")
+    return state
+
+
+@app.post("/api/profiles/{profile_id}/backfill", response_model=BackfillResponse)
+def start_backfill(
+    profile_id: int,
+    session: Session = Depends(get_session)
+):
+    """Start (or restart from the newest post) a chunked history backfill"""
     profile = session.get(Profile, profile_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
+    state = session.get(BackfillState, profile_id) or BackfillState(profile_id=profile_id)
+    state.status = "pending"
+    state.frozen_iterator = None
+    state.oldest_timestamp = None
+    state.posts_done = 0
+    state.last_error = None
+    state.updated_at = datetime.utcnow()
+    session.add(state)
+    session.commit()
+    session.refresh(state)
+    return state
+
+
+# Operations endpoints
+@app.post("/api/check/{profile_id}")
+async def force_check(profile_id: int):
+    def get_username() -> str:
+        with Session(engine) as session:
+            profile = session.get(Profile, profile_id)
+            if not profile:
+                raise HTTPException(status_code=404, detail="Profile not found")
+            
+            if not profile.is_active:
+                raise HTTPException(status_code=400, detail="Profile is not active")
+            return profile.username
+    
+    username = await run_in_threadpool(get_username)
+    
+    # Start the check, or join the one already running, without waiting for it
+    run = scheduler.force_check(profile_id)
+    
+    # Log
+    def log_trigger():
+        with Session(engine) as session:
+            log_entry = SystemLog(
+                level="info",
+                message=f"Manual check triggered for @{username}",
+                details=f"Run {run['run_id']}" + (" (joined running check)" if run["joined"] else ""),
+                profile_id=profile_id
+            )
+            session.add(log_entry)
+            session.commit()
+    
+    await run_in_threadpool(log_trigger)
+    
+    return {"message": "Check already running" if run["joined"] else "Check started", **run}
+
+
+@app.get("/api/check/{profile_id}")
+async def get_check_status(profile_id: int):
+    """Status of the current or last scrape run for a profile"""
+    run = scheduler.get_run(profile_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="No run recorded for this profile")
+    return run
+
+
+def _run_test_scraping(job: Job, profile_id: int):
+    """Job body for /api/test: check Instagram access for a profile with detailed steps"""
+    with Session(engine) as session:
+        profile = session.get(Profile, profile_id)
+        if not profile:
+            raise ValueError("Profile not found")
+        username = profile.username
+        webhook_url = profile.webhook_url
+    
     test_results = {
-        "profile": profile.username,
-        "steps": [],
+        "profile": username,
+        "steps": job.steps,
         "success": False,
         "media_found": None,
         "webhook_result": None,
@@ -242,28 +429,15 @@ async def test_scraping(
     
     try:
         # Step 1: Initialize scraper
-        test_results["steps"].append({
-            "step": "initialize_scraper",
-            "status": "started",
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        job.add_step("initialize_scraper", "started")
         
         from .scheduler import get_scraper
-        from .webhook import WebhookSender
         scraper = get_scraper()  # Use singleton instance
         
-        test_results["steps"].append({
-            "step": "initialize_scraper",
-            "status": "completed",
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        job.add_step("initialize_scraper", "completed")
         
         # Step 2: Get Instagram profile with rate limit handling
-        test_results["steps"].append({
-            "step": "fetch_profile",
-            "status": "started",
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        job.add_step("fetch_profile", "started")
         
         import instaloader
         from instaloader.exceptions import ConnectionException
@@ -272,32 +446,20 @@ async def test_scraping(
         try:
             # Add delay before request
             time.sleep(2)
-            ig_profile = instaloader.Profile.from_username(scraper.loader.context, profile.username)
+            ig_profile = instaloader.Profile.from_username(scraper.loader.context, username)
             
-            test_results["steps"].append({
-                "step": "fetch_profile",
-                "status": "completed",
-                "details": f"Found profile: {ig_profile.full_name} ({ig_profile.mediacount} posts)",
-                "timestamp": datetime.utcnow().isoformat()
-            })
+            job.add_step("fetch_profile", "completed",
+                         f"Found profile: {ig_profile.full_name} ({ig_profile.mediacount} posts)")
         except ConnectionException as e:
             if "401" in str(e) or "Please wait a few minutes" in str(e):
                 test_results["error"] = "Rate limit atingido. Por favor, aguarde 5-10 minutos antes de tentar novamente."
-                test_results["steps"].append({
-                    "step": "fetch_profile",
-                    "status": "failed",
-                    "details": "Instagram está limitando requisições anônimas. Isso é normal.",
-                    "timestamp": datetime.utcnow().isoformat()
-                })
+                job.add_step("fetch_profile", "failed",
+                             "Instagram está limitando requisições anônimas. Isso é normal.")
                 return test_results
             raise
         
         # Step 3: Check if we can access posts (without downloading)
-        test_results["steps"].append({
-            "step": "check_posts_access",
-            "status": "started",
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        job.add_step("check_posts_access", "started")
         
         # Add delay before accessing posts
         time.sleep(3)
@@ -308,12 +470,8 @@ async def test_scraping(
             first_post = next(posts_iterator, None)
             
             if first_post:
-                test_results["steps"].append({
-                    "step": "check_posts_access",
-                    "status": "completed",
-                    "details": f"Acesso confirmado. Perfil tem posts públicos.",
-                    "timestamp": datetime.utcnow().isoformat()
-                })
+                job.add_step("check_posts_access", "completed",
+                             f"Acesso confirmado. Perfil tem posts públicos.")
                 
                 # Only get post info, don't download
                 test_results["media_found"] = {
@@ -329,105 +487,119 @@ async def test_scraping(
                 test_results["success"] = True
                 
                 # Test webhook with mock data
-                if profile.webhook_url:
-                    test_results["steps"].append({
-                        "step": "test_webhook_config",
-                        "status": "completed",
-                        "details": f"Webhook configurado: {profile.webhook_url[:50]}...",
-                        "timestamp": datetime.utcnow().isoformat()
-                    })
+                if webhook_url:
+                    job.add_step("test_webhook_config", "completed",
+                                 f"Webhook configurado: {webhook_url[:50]}...")
                     test_results["webhook_result"] = {
                         "configured": True,
-                        "url": profile.webhook_url,
+                        "url": webhook_url,
                         "test_skipped": True,
                         "reason": "Teste real será feito durante scraping agendado"
                     }
             else:
-                test_results["steps"].append({
-                    "step": "check_posts_access",
-                    "status": "failed",
-                    "details": "Não foi possível acessar posts do perfil",
-                    "timestamp": datetime.utcnow().isoformat()
-                })
+                job.add_step("check_posts_access", "failed",
+                             "Não foi possível acessar posts do perfil")
         except ConnectionException as e:
             if "401" in str(e) or "Please wait a few minutes" in str(e):
                 test_results["error"] = "Rate limit atingido ao acessar posts. Aguarde 5-10 minutos."
-                test_results["steps"].append({
-                    "step": "check_posts_access",
-                    "status": "failed",
-                    "details": "Instagram limitou o acesso. Isso é normal para requisições anônimas.",
-                    "timestamp": datetime.utcnow().isoformat()
-                })
+                job.add_step("check_posts_access", "failed",
+                             "Instagram limitou o acesso. Isso é normal para requisições anônimas.")
                 return test_results
             raise
             
     except Exception as e:
         test_results["error"] = str(e)
-        test_results["steps"].append({
-            "step": "error",
-            "status": "failed",
-            "details": str(e),
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        job.add_step("error", "failed", str(e))
     
     # Log test
-    log_entry = SystemLog(
-        level="info",
-        message=f"Test scraping completed for @{profile.username}",
-        details=f"Success: {test_results['success']}",
-        profile_id=profile_id
-    )
-    session.add(log_entry)
-    session.commit()
-    
-    # Notify websockets
-    await notify_websockets({
-        "type": "log",
-        "data": LogResponse.model_validate(log_entry).model_dump()
-    })
+    with Session(engine) as session:
+        log_entry = SystemLog(
+            level="info",
+            message=f"Test scraping completed for @{username}",
+            details=f"Success: {test_results['success']}",
+            profile_id=profile_id
+        )
+        session.add(log_entry)
+        session.commit()
     
     return test_results
 
 
-@app.get("/api/stats", response_model=StatsResponse)
-async def get_stats(session: Session = Depends(get_session)):
-    total_profiles = session.exec(select(Profile)).all()
-    active_profiles = session.exec(
-        select(Profile).where(Profile.is_active == True)
-    ).all()
-    
-    total_posts = session.exec(
-        select(MediaLog).where(MediaLog.media_type == "post")
-    ).all()
-    
-    total_stories = session.exec(
-        select(MediaLog).where(MediaLog.media_type == "story")
-    ).all()
-    
-    total_errors = session.exec(
-        select(SystemLog).where(SystemLog.level == "error")
-    ).all()
-    
-    last_log = session.exec(
-        select(SystemLog).order_by(SystemLog.created_at.desc()).limit(1)
-    ).first()
+@app.post("/api/test/{profile_id}", status_code=202)
+def test_scraping(
+    profile_id: int,
+    session: Session = Depends(get_session)
+):
+    """Start a test scrape in the background; follow it via /api/jobs/{job_id}"""
+    profile = session.get(Profile, profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
     
-    return StatsResponse(
-        total_profiles=len(total_profiles),
-        active_profiles=len(active_profiles),
-        total_posts=len(total_posts),
-        total_stories=len(total_stories),
-        total_errors=len(total_errors),
-        last_check=last_log.created_at if last_log else None
-    )
+    job, created = job_runner.submit("test_scraping", profile_id, _run_test_scraping, profile_id)
+    return {"job_id": job.id, "status": job.status, "deduplicated": not created}
+
+
+@app.get("/api/stats", response_model=StatsResponse)
+async def get_stats():
+    # Served from in-memory counters; see app.stats
+    return StatsResponse(**stats_tracker.stats())
+
+
+@app.get("/api/stats/slo", response_model=List[SloStats])
+def get_slo_stats(
+    session: Session = Depends(get_session),
+    profile_id: Optional[int] = None,
+    lane: Optional[str] = None,
+    since: Optional[datetime] = None
+):
+    """Per-profile SLO attainment: how often, and by how much, the time
+    between runs overshot the profile's target (last 24 hours by default)"""
+    late = func.coalesce(ScrapeRun.late_seconds, 0)
+    conditions = [ScrapeRun.started_at >= (since or datetime.utcnow() - timedelta(hours=24))]
+    if profile_id is not None:
+        conditions.append(ScrapeRun.profile_id == profile_id)
+    if lane:
+        conditions.append(ScrapeRun.lane == lane)
+    totals = select(
+        ScrapeRun.profile_id,
+        func.count(ScrapeRun.id).label("runs"),
+        func.sum(case((ScrapeRun.late_seconds == 0, 1), else_=0)).label("met"),
+        func.count(ScrapeRun.late_seconds).label("measured"),
+        func.avg(late).label("avg_late_seconds"),
+        func.max(late).label("max_late_seconds"),
+        func.max(ScrapeRun.started_at).label("last_run_at"),
+    ).where(*conditions).group_by(ScrapeRun.profile_id).subquery()
+    # Lane and target are reported as of each profile's latest run
+    latest = select(
+        ScrapeRun.profile_id,
+        ScrapeRun.lane,
+        ScrapeRun.target_minutes,
+        func.row_number().over(
+            partition_by=ScrapeRun.profile_id,
+            order_by=(ScrapeRun.started_at.desc(), ScrapeRun.id.desc())
+        ).label("position"),
+    ).where(*conditions).subquery()
+    query = select(
+        totals.c.profile_id, latest.c.lane, latest.c.target_minutes, totals.c.runs, totals.c.met,
+        totals.c.measured, totals.c.avg_late_seconds, totals.c.max_late_seconds, totals.c.last_run_at
+    ).join(latest, (latest.c.profile_id == totals.c.profile_id) & (latest.c.position == 1))
+    rows = session.exec(query).all()
+    return [
+        SloStats(
+            **{key: value for key, value in row._mapping.items() if key != "measured"},
+            attainment=row.met / row.measured if row.measured else None
+        )
+        for row in rows
+    ]
 
 
 # Logs endpoints
 @app.get("/api/logs", response_model=List[LogResponse])
-async def get_logs(
+def get_logs(
     session: Session = Depends(get_session),
     level: Optional[str] = None,
     profile_id: Optional[int] = None,
+    username: Optional[str] = None,
     limit: int = 100,
     offset: int = 0
 ):
@@ -439,60 +611,252 @@ async def get_logs(
     if profile_id:
         query = query.where(SystemLog.profile_id == profile_id)
     
+    if username:
+        # profile lives in the core database, ATTACHed to the logs connection
+        query = query.join(Profile, Profile.id == SystemLog.profile_id).where(Profile.username == username)
+    
     query = query.order_by(SystemLog.created_at.desc()).offset(offset).limit(limit)
     logs = session.exec(query).all()
     
     return logs
 
 
+# Media endpoints
+def _media_filters(query, profile_id, media_type, since, until, webhook_sent=None):
+    if profile_id is not None:
+        query = query.where(Post.profile_id == profile_id)
+    if media_type:
+        query = query.where(Post.media_type == media_type)
+    if since:
+        query = query.where(Post.timestamp >= since)
+    if until:
+        query = query.where(Post.timestamp < until)
+    if webhook_sent is not None:
+        query = query.where(MediaItem.webhook_sent == webhook_sent)
+    return query
+
+
+def _encode_media_cursor(timestamp: datetime, post_id: int, media_id: int) -> str:
+    return f"{timestamp.isoformat()}_{post_id}_{media_id}"
+
+
+def _decode_media_cursor(cursor: str):
+    try:
+        timestamp, post_id, media_id = cursor.rsplit("_", 2)
+        return datetime.fromisoformat(timestamp), int(post_id), int(media_id)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+
+
+@app.get("/api/media", response_model=MediaPage)
+def list_media(
+    session: Session = Depends(get_session),
+    profile_id: Optional[int] = None,
+    media_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    webhook_sent: Optional[bool] = None,
+    include_caption: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Captured media files, newest first.
+
+    Pages are keyset-paginated on (post timestamp, post id, file id), all
+    read off indexes while walking posts newest first: pass the returned
+    ``next_cursor`` back as ``cursor``. Captions are left out unless asked for.
+    """
+    columns = [
+        MediaItem.id, MediaItem.post_id, Post.profile_id, Post.media_type, Post.instagram_id,
+        MediaItem.media_path, MediaItem.file_type, MediaItem.size_bytes, Post.timestamp,
+        MediaItem.webhook_sent, MediaItem.sent_at
+    ]
+    if include_caption:
+        columns.append(Post.caption)
+    # "+ 0" keeps SQLite from looking posts up by id from each file, which
+    # sorted every file; instead it walks posts newest first and reads each
+    # post's files off ix_mediaitem_post_id, already in page order
+    query = select(*columns).join(Post, Post.id + 0 == MediaItem.post_id)
+    query = _media_filters(query, profile_id, media_type, since, until, webhook_sent)
+    
+    if cursor:
+        timestamp, post_id, media_id = _decode_media_cursor(cursor)
+        query = query.where(
+            tuple_(Post.timestamp, Post.id, MediaItem.id) < tuple_(timestamp, post_id, media_id)
+        )
+    
+    # Fetch one extra row to know whether there is a next page
+    rows = session.exec(
+        query.order_by(Post.timestamp.desc(), Post.id.desc(), MediaItem.id.desc()).limit(limit + 1)
+    ).all()
+    items = [MediaResponse(**row._mapping) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = _encode_media_cursor(items[-1].timestamp, items[-1].post_id, items[-1].id)
+    
+    return MediaPage(items=items, next_cursor=next_cursor)
+
+
+@app.get("/api/media/summary", response_model=List[MediaSummary])
+def media_summary(
+    session: Session = Depends(get_session),
+    profile_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """Per-profile media counts, aggregated in SQL: ``posts``/``stories`` count
+    Instagram posts and story items, ``total``/``pending`` their files"""
+    query = select(
+        Post.profile_id,
+        func.count(MediaItem.id).label("total"),
+        func.count(func.distinct(case((Post.media_type == "post", Post.id)))).label("posts"),
+        func.count(func.distinct(case((Post.media_type == "story", Post.id)))).label("stories"),
+        func.sum(case((MediaItem.webhook_sent == False, 1), else_=0)).label("pending"),
+        func.max(Post.timestamp).label("last_timestamp"),
+    ).join(MediaItem, MediaItem.post_id == Post.id)
+    query = _media_filters(query, profile_id, None, since, until).group_by(Post.profile_id)
+    return [MediaSummary(**row._mapping) for row in session.exec(query).all()]
+
+
+@app.get("/api/media/search")
+def search_media_endpoint(
+    q: str,
+    session: Session = Depends(get_session),
+    profile_id: Optional[int] = None,
+    media_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """Full-text search over captions and usernames, best matches first"""
+    return search_media(session, q, profile_id, media_type, since, until, limit, offset)
+
+
+@app.get("/api/logs/rollups", response_model=List[LogRollupResponse])
+def get_log_rollups(
+    session: Session = Depends(get_session),
+    level: Optional[str] = None,
+    profile_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    limit: int = Query(500, ge=1, le=5000)
+):
+    """Hourly counts of logs older than the retention period"""
+    query = select(LogRollup)
+    if level:
+        query = query.where(LogRollup.level == level)
+    if profile_id:
+        query = query.where(LogRollup.profile_id == profile_id)
+    if since:
+        query = query.where(LogRollup.hour >= since)
+    return session.exec(query.order_by(LogRollup.hour.desc()).limit(limit)).all()
+
+
 # WebSocket for real-time logs
+def _parse_filters(levels: Optional[str], profile_ids: Optional[str]):
+    level_set = [l.strip() for l in levels.split(",") if l.strip()] if levels else None
+    profile_set = [int(p) for p in profile_ids.split(",") if p.strip()] if profile_ids else None
+    return level_set, profile_set
+
+
+def _load_missed_logs(level_set, profile_set, since_id: Optional[int], limit: int):
+    """Logs to replay on connect: those after ``since_id``, or the 20 most recent"""
+    with Session(engine) as session:
+        query = select(SystemLog)
+        if level_set:
+            query = query.where(SystemLog.level.in_(level_set))
+        if profile_set:
+            query = query.where(SystemLog.profile_id.in_(profile_set))
+        
+        if since_id is not None:
+            # Fetch one extra row to know whether the replay was cut short
+            missed = session.exec(
+                query.where(SystemLog.id > since_id).order_by(SystemLog.id).limit(limit + 1)
+            ).all()
+            truncated = len(missed) > limit
+            missed = missed[:limit]
+        else:
+            missed = list(reversed(session.exec(
+                query.order_by(SystemLog.id.desc()).limit(20)
+            ).all()))
+            truncated = False
+        
+        return [LogResponse.model_validate(log).model_dump(mode="json") for log in missed], truncated
+
+
 @app.websocket("/ws/logs")
-async def websocket_logs(websocket: WebSocket):
+async def websocket_logs(
+    websocket: WebSocket,
+    levels: Optional[str] = None,
+    profile_ids: Optional[str] = None,
+    since_id: Optional[int] = None,
+    limit: int = 200
+):
+    """Stream logs in batched frames: {"type": "batch", "events": [...], "cursor": id, "dropped": n}
+
+    Filters can be given as query params (``?levels=error,warning&profile_ids=1,2``)
+    or changed later by sending {"type": "subscribe", "levels": [...], "profile_ids": [...]}.
+    Reconnecting clients pass the last ``cursor`` as ``since_id`` to get the
+    logs they missed in a single replay frame before live streaming resumes.
+    """
     await websocket.accept()
-    websocket_connections.append(websocket)
+    level_set, profile_set = _parse_filters(levels, profile_ids)
+    # Subscribe before querying so nothing emitted during the replay is lost;
+    # live copies of the replayed logs are then dropped by the subscriber
+    subscriber = log_hub.subscribe(websocket, level_set, profile_set)
     
     try:
-        # Send recent logs on connection
-        with Session(engine) as session:
-            recent_logs = session.exec(
-                select(SystemLog)
-                .order_by(SystemLog.created_at.desc())
-                .limit(20)
-            ).all()
-            
-            for log in reversed(recent_logs):
-                await websocket.send_json({
-                    "type": "log",
-                    "data": LogResponse.model_validate(log).model_dump_json()
-                })
+        limit = max(1, min(limit, WS_REPLAY_LIMIT))
+        missed, truncated = await run_in_threadpool(
+            _load_missed_logs, level_set, profile_set, since_id, limit
+        )
+        subscriber.replayed = {log["id"] for log in missed}
+        subscriber.last_id = missed[-1]["id"] if missed else (since_id or 0)
+        
+        await log_hub.send_frame(
+            subscriber,
+            [{"type": "log", "data": log} for log in missed],
+            replay=True,
+            truncated=truncated
+        )
         
-        # Keep connection alive
-        while True:
-            await websocket.receive_text()
-            
     except WebSocketDisconnect:
-        websocket_connections.remove(websocket)
+        log_hub.unsubscribe(subscriber)
+        return
+    
+    def on_message(message: dict):
+        if message.get("type") == "subscribe":
+            subscriber.set_filters(message.get("levels"), message.get("profile_ids"))
+    
+    # Stream live logs and handle subscription changes until the client goes away
+    await log_hub.serve(subscriber, on_message)
+
 
+# WebSocket for dashboard stats and profile status
+@app.websocket("/ws/dashboard")
+async def websocket_dashboard(websocket: WebSocket):
+    """Push dashboard state instead of polling.
 
-async def notify_websockets(data: dict):
-    """Send data to all connected websockets"""
-    disconnected = []
+    Sends {"type": "snapshot", "stats": {...}, "profiles": {id: status}} on
+    connect, then batched frames of ``stats`` events (changed fields only) and
+    ``profile_status`` events. A frame with ``dropped`` means the client fell
+    behind and should reconnect for a fresh snapshot.
+    """
+    await websocket.accept()
+    subscriber = log_hub.subscribe(websocket, topics=("stats", "profile_status"))
     
-    for websocket in websocket_connections:
-        try:
-            await websocket.send_json(data)
-        except:
-            disconnected.append(websocket)
+    try:
+        await websocket.send_json({"type": "snapshot", **stats_tracker.snapshot()})
+    except WebSocketDisconnect:
+        log_hub.unsubscribe(subscriber)
+        return
     
-    # Remove disconnected websockets
-    for ws in disconnected:
-        if ws in websocket_connections:
-            websocket_connections.remove(ws)
+    await log_hub.serve(subscriber)
 
 
 # Instagram Account endpoints
 @app.post("/api/instagram-accounts", response_model=InstagramAccountResponse)
-async def create_instagram_account(
+def create_instagram_account(
     account: InstagramAccountCreate,
     session: Session = Depends(get_session)
 ):
@@ -506,7 +870,7 @@ async def create_instagram_account(
     # Create new account with hashed password
     db_account = InstagramAccount(
         username=account.username,
-        password_hash=pwd_context.hash(account.password)
+        password_hash=get_pwd_context().hash(account.password)
     )
     session.add(db_account)
     session.commit()
@@ -532,17 +896,11 @@ async def create_instagram_account(
     session.add(log_entry)
     session.commit()
     
-    # Notify websockets
-    await notify_websockets({
-        "type": "log",
-        "data": LogResponse.model_validate(log_entry).model_dump()
-    })
-    
     return response
 
 
 @app.get("/api/instagram-accounts", response_model=List[InstagramAccountResponse])
-async def get_instagram_accounts(session: Session = Depends(get_session)):
+def get_instagram_accounts(session: Session = Depends(get_session)):
     accounts = session.exec(select(InstagramAccount)).all()
     
     response_list = []
@@ -566,7 +924,7 @@ async def get_instagram_accounts(session: Session = Depends(get_session)):
 
 
 @app.put("/api/instagram-accounts/{account_id}", response_model=InstagramAccountResponse)
-async def update_instagram_account(
+def update_instagram_account(
     account_id: int,
     update: InstagramAccountUpdate,
     session: Session = Depends(get_session)
@@ -579,7 +937,7 @@ async def update_instagram_account(
     if update.username is not None:
         account.username = update.username
     if update.password is not None:
-        account.password_hash = pwd_context.hash(update.password)
+        account.password_hash = get_pwd_context().hash(update.password)
         # Clear session file if password changed
         if account.session_file:
             session_file = Path(account.session_file)
@@ -612,7 +970,7 @@ async def update_instagram_account(
 
 
 @app.delete("/api/instagram-accounts/{account_id}")
-async def delete_instagram_account(
+def delete_instagram_account(
     account_id: int,
     session: Session = Depends(get_session)
 ):
@@ -632,73 +990,97 @@ async def delete_instagram_account(
     return {"message": "Instagram account deleted"}
 
 
-@app.post("/api/instagram-accounts/{account_id}/test-login")
-async def test_instagram_login(
-    account_id: int,
-    password: str,
-    session: Session = Depends(get_session)
-):
-    account = session.get(InstagramAccount, account_id)
-    if not account:
-        raise HTTPException(404, "Instagram account not found")
-    
-    # Verify password
-    if not pwd_context.verify(password, account.password_hash):
-        raise HTTPException(401, "Invalid password")
-    
-    # Test login
+def _run_test_login(job: Job, account_id: int, password: str):
+    """Job body for test-login: log in to Instagram and save the session"""
     from .scheduler import get_scraper
     scraper = get_scraper()  # Use singleton instance
     
+    with Session(engine) as session:
+        account = session.get(InstagramAccount, account_id)
+        if not account:
+            raise ValueError("Instagram account not found")
+        username = account.username
+    
+    job.add_step("login", "started")
     try:
         success = scraper.login_with_account(account_id, password)
-        if success:
-            # Log success
+    except Exception as e:
+        job.add_step("login", "failed", str(e))
+        # Log error
+        with Session(engine) as session:
+            log_entry = SystemLog(
+                level="error",
+                message=f"Instagram login failed for @{username}",
+                details=str(e)
+            )
+            session.add(log_entry)
+            session.commit()
+        raise
+    
+    if success:
+        job.add_step("login", "completed", "Session saved for future use")
+        # Log success
+        with Session(engine) as session:
             log_entry = SystemLog(
                 level="info",
-                message=f"Instagram login successful for @{account.username}",
+                message=f"Instagram login successful for @{username}",
                 details="Session saved for future use"
             )
             session.add(log_entry)
             session.commit()
-            
-            await notify_websockets({
-                "type": "log",
-                "data": LogResponse.model_validate(log_entry).model_dump()
-            })
-            
-            return {
-                "success": True,
-                "message": "Login successful",
-                "has_valid_session": True
-            }
-        else:
-            return {
-                "success": False,
-                "message": "Login failed",
-                "has_valid_session": False
-            }
-    except Exception as e:
-        # Log error
-        log_entry = SystemLog(
-            level="error",
-            message=f"Instagram login failed for @{account.username}",
-            details=str(e)
-        )
-        session.add(log_entry)
-        session.commit()
         
-        await notify_websockets({
-            "type": "log",
-            "data": LogResponse.model_validate(log_entry).model_dump()
-        })
-        
-        raise HTTPException(400, f"Login failed: {str(e)}")
+        return {
+            "success": True,
+            "message": "Login successful",
+            "has_valid_session": True
+        }
+    
+    job.add_step("login", "failed")
+    return {
+        "success": False,
+        "message": "Login failed",
+        "has_valid_session": False
+    }
+
+
+@app.post("/api/instagram-accounts/{account_id}/test-login", status_code=202)
+def test_instagram_login(
+    account_id: int,
+    password: str,
+    session: Session = Depends(get_session)
+):
+    """Start an Instagram login in the background; follow it via /api/jobs/{job_id}"""
+    account = session.get(InstagramAccount, account_id)
+    if not account:
+        raise HTTPException(404, "Instagram account not found")
+    
+    # Verify password
+    if not get_pwd_context().verify(password, account.password_hash):
+        raise HTTPException(401, "Invalid password")
+    
+    job, created = job_runner.submit("test_login", account_id, _run_test_login, account_id, password)
+    return {"job_id": job.id, "status": job.status, "deduplicated": not created}
+
+
+# Job endpoints
+@app.get("/api/jobs")
+async def list_jobs(kind: Optional[str] = None, limit: int = 50):
+    jobs = [job for job in job_runner.list() if kind is None or job.kind == kind]
+    return [job.to_dict() for job in jobs[:limit]]
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Current status, progress steps and (once finished) result of a background job"""
+    job = job_runner.get(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return job.to_dict()
 
 
 # Session status endpoint
 @app.get("/api/session-status")
-async def get_session_status(session: Session = Depends(get_session)):
+def get_session_status(session: Session = Depends(get_session)):
     """Get detailed Instagram session status"""
     scraper = get_scraper()
     
@@ -747,7 +1129,25 @@ async def get_session_status(session: Session = Depends(get_session)):
         raise HTTPException(500, f"Error checking session: {str(e)}")
 
 
-# Health check
+# Health check (liveness): the process is up and the event loop responds
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
\ No newline at end of file
+    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+
+
+# Readiness: the database is initialized and the Instagram scraper is warmed up
+@app.get("/ready")
+async def readiness_check():
+    checks = {
+        "database": startup_state["status"],
+        "scraper": scraper_state["status"],
+    }
+    ready = all(status == "ready" for status in checks.values())
+    body = {
+        "status": "ready" if ready else "starting",
+        "checks": checks,
+        "timestamp": datetime.utcnow().isoformat(),
+    }
+    if startup_state["error"] or scraper_state["error"]:
+        body["error"] = startup_state["error"] or scraper_state["error"]
+    return JSONResponse(body, status_code=200 if ready else 503)
\ No newline at end of file
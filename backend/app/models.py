@@ -1,6 +1,7 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 
 
 class InstagramAccount(SQLModel, table=True):
@@ -18,29 +19,95 @@ class Profile(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     username: str = Field(index=True, unique=True)
     webhook_url: str
-    check_interval: int = Field(default=30)  # minutes
+    telegram_chat_id: Optional[str] = None  # Comma-separated chat ids, sent via TELEGRAM_BOT_TOKEN
+    check_interval: int = Field(default=30)  # minutes, as requested
+    priority: int = Field(default=1)  # Weight in the request budget; higher polls closer to check_interval
+    slo_minutes: Optional[int] = None  # Detection target; set, it puts the profile in the critical lane
+    planned_interval: Optional[int] = None  # minutes, as scheduled within the request budget
+    avg_requests_per_run: Optional[float] = None  # Instagram queries per scrape, moving average
     download_posts: bool = Field(default=True)
     download_stories: bool = Field(default=True)
     last_post_timestamp: Optional[datetime] = None
     last_story_timestamp: Optional[datetime] = None
+    recent_post_shortcodes: Optional[str] = None  # JSON list, newest first
+    instagram_userid: Optional[int] = None  # Cached so stories can be checked in batches
     is_active: bool = Field(default=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 
-class MediaLog(SQLModel, table=True):
+class Post(SQLModel, table=True):
+    """An Instagram post or story item; its files are ``MediaItem`` rows"""
+    # Keyset pagination of /api/media walks (timestamp, id) newest first
+    __table_args__ = (
+        Index("ix_post_timestamp_id", "timestamp", "id"),
+        Index("ix_post_profile_timestamp_id", "profile_id", "timestamp", "id"),
+    )
+    
     id: Optional[int] = Field(default=None, primary_key=True)
     profile_id: int = Field(foreign_key="profile.id")
     media_type: str  # "post" or "story"
+    instagram_id: str = Field(unique=True, index=True)  # Looked up before every download
     caption: Optional[str] = None
-    media_path: str
-    instagram_id: str
     timestamp: datetime
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class MediaItem(SQLModel, table=True):
+    """One downloaded file of a post, with its delivery state"""
+    # /api/media?webhook_sent=... looks up each post's files by delivery state
+    __table_args__ = (
+        Index("ix_mediaitem_webhook_sent_post_id", "webhook_sent", "post_id"),
+    )
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    post_id: int = Field(foreign_key="post.id", index=True)
+    media_path: str
+    file_type: str  # "image" or "video"
+    size_bytes: Optional[int] = None
+    sha256: Optional[str] = None
+    variants: Optional[str] = None  # JSON {name: path} of smaller renditions, see variants.py
     webhook_sent: bool = Field(default=False)
     sent_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+class BackfillState(SQLModel, table=True):
+    profile_id: int = Field(foreign_key="profile.id", primary_key=True)
+    status: str = Field(default="pending")  # "pending", "done", "failed"
+    frozen_iterator: Optional[str] = None  # JSON of instaloader's FrozenNodeIterator
+    oldest_timestamp: Optional[datetime] = None  # Oldest post reached so far
+    posts_done: int = Field(default=0)
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class JobSchedule(SQLModel, table=True):
+    """Next run of a scheduler job, saved so restarts keep the timers"""
+    job_id: str = Field(primary_key=True)
+    next_run_time: datetime  # UTC
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class Destination(SQLModel, table=True):
+    """Where a profile's new media is delivered; a profile can have many"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    profile_id: int = Field(foreign_key="profile.id", index=True)
+    kind: str  # "webhook" or "telegram"
+    target: str  # Webhook URL or Telegram chat id
+    is_active: bool = Field(default=True)
+    variant: Optional[str] = None  # Rendition to send ("preview", "thumb"); None sends originals
+    # Outcome of the latest delivery
+    last_status: Optional[str] = None  # "ok", "partial", "failed"
+    last_error: Optional[str] = None
+    last_latency_ms: Optional[int] = None  # Mean per send
+    last_delivery_at: Optional[datetime] = None
+    sent_count: int = Field(default=0)
+    failed_count: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class SystemLog(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     level: str  # "info", "warning", "error"
@@ -50,18 +117,52 @@ class SystemLog(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+class LogRollup(SQLModel, table=True):
+    """Hourly count of pruned SystemLog rows (see retention.py)"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    hour: datetime = Field(index=True)  # Start of the hour, UTC
+    level: str
+    profile_id: Optional[int] = None
+    kind: str  # Message with usernames and numbers masked
+    count: int = Field(default=0)
+
+
+class ScrapeRun(SQLModel, table=True):
+    """One profile check, for SLO attainment stats"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    profile_id: int = Field(index=True)
+    lane: str  # "critical" or "standard"
+    trigger: str  # "scheduled" or "manual"
+    status: str  # "completed" or "failed"
+    target_minutes: int  # slo_minutes, or the planned interval
+    gap_seconds: Optional[float] = None  # Since the profile's previous run started
+    late_seconds: Optional[float] = None  # How far the gap overshot the target
+    started_at: datetime = Field(index=True)
+    finished_at: datetime
+
+
 # Pydantic models for API requests/responses
 class ProfileCreate(SQLModel):
     username: str
     webhook_url: str
+    telegram_chat_id: Optional[str] = None
     check_interval: int = 30
+    priority: int = Field(default=1, ge=1)
+    slo_minutes: Optional[int] = Field(default=None, ge=1)
     download_posts: bool = True
     download_stories: bool = True
+    # "latest": first run picks up the most recent feed pages
+    # "now": only posts published after the profile is added
+    # "full": whole history, backfilled in chunks at low priority
+    history: Literal["latest", "now", "full"] = "latest"
 
 
 class ProfileUpdate(SQLModel):
     webhook_url: Optional[str] = None
+    telegram_chat_id: Optional[str] = None
     check_interval: Optional[int] = None
+    priority: Optional[int] = Field(default=None, ge=1)
+    slo_minutes: Optional[int] = Field(default=None, ge=1)
     download_posts: Optional[bool] = None
     download_stories: Optional[bool] = None
     is_active: Optional[bool] = None
@@ -71,7 +172,12 @@ class ProfileResponse(SQLModel):
     id: int
     username: str
     webhook_url: str
+    telegram_chat_id: Optional[str]
     check_interval: int
+    priority: int
+    slo_minutes: Optional[int]
+    planned_interval: Optional[int]
+    avg_requests_per_run: Optional[float]
     download_posts: bool
     download_stories: bool
     is_active: bool
@@ -81,6 +187,73 @@ class ProfileResponse(SQLModel):
     updated_at: datetime
 
 
+class BackfillResponse(SQLModel):
+    profile_id: int
+    status: str
+    posts_done: int
+    oldest_timestamp: Optional[datetime]
+    last_error: Optional[str]
+    updated_at: datetime
+
+
+class MediaResponse(SQLModel):
+    id: int  # MediaItem id
+    post_id: int
+    profile_id: int
+    media_type: str
+    instagram_id: str
+    media_path: str
+    file_type: str
+    size_bytes: Optional[int]
+    timestamp: datetime
+    webhook_sent: bool
+    sent_at: Optional[datetime]
+    caption: Optional[str] = None  # Only with include_caption=true
+
+
+class MediaPage(SQLModel):
+    items: List[MediaResponse]
+    next_cursor: Optional[str]  # Pass as ``cursor`` to get the next page
+
+
+class MediaSummary(SQLModel):
+    profile_id: int
+    total: int  # Files
+    posts: int
+    stories: int
+    pending: int  # Files not delivered yet
+    last_timestamp: Optional[datetime]
+
+
+class DestinationCreate(SQLModel):
+    kind: Literal["webhook", "telegram"]
+    target: str
+    is_active: bool = True
+    variant: Optional[Literal["preview", "thumb"]] = None
+
+
+class DestinationUpdate(SQLModel):
+    target: Optional[str] = None
+    is_active: Optional[bool] = None
+    variant: Optional[Literal["preview", "thumb"]] = None
+
+
+class DestinationResponse(SQLModel):
+    id: int
+    profile_id: int
+    kind: str
+    target: str
+    is_active: bool
+    variant: Optional[str]
+    last_status: Optional[str]
+    last_error: Optional[str]
+    last_latency_ms: Optional[int]
+    last_delivery_at: Optional[datetime]
+    sent_count: int
+    failed_count: int
+    created_at: datetime
+
+
 class LogResponse(SQLModel):
     id: int
     level: str
@@ -90,6 +263,26 @@ class LogResponse(SQLModel):
     created_at: datetime
 
 
+class LogRollupResponse(SQLModel):
+    hour: datetime
+    level: str
+    profile_id: Optional[int]
+    kind: str
+    count: int
+
+
+class SloStats(SQLModel):
+    profile_id: int
+    lane: str
+    target_minutes: int  # Of the latest run
+    runs: int
+    met: int  # Runs that started within target_minutes of the previous one
+    attainment: Optional[float]  # met / runs with a previous run, 0-1
+    avg_late_seconds: float
+    max_late_seconds: float
+    last_run_at: datetime
+
+
 class StatsResponse(SQLModel):
     total_profiles: int
     active_profiles: int
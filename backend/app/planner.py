@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+from typing import Dict, List
+from sqlalchemy import func
+from sqlmodel import select
+from .models import InstagramAccount, Post, Profile
+from .database import Session, engine
+import math
+import os
+
+# Instagram queries per hour the scheduler may plan for, with a logged-in
+# account and without one (anonymous access is limited much harder)
+INSTAGRAM_REQUESTS_PER_HOUR = int(os.getenv("INSTAGRAM_REQUESTS_PER_HOUR", "200"))
+ANONYMOUS_REQUESTS_PER_HOUR = int(os.getenv("ANONYMOUS_REQUESTS_PER_HOUR", "60"))
+# Cost assumed for profiles without a measured run yet: profile lookup,
+# a feed page and the stories check
+DEFAULT_REQUESTS_PER_RUN = 3.0
+PLANNER_MAX_INTERVAL_MINUTES = int(os.getenv("PLANNER_MAX_INTERVAL_MINUTES", "1440"))
+# Share of the budget reserved for the critical lane (profiles with an SLO).
+# It is a floor: the critical lane also gets what standard profiles do not
+# need, and whatever it leaves unused goes to the standard lane
+CRITICAL_BUDGET_SHARE = float(os.getenv("CRITICAL_BUDGET_SHARE", "0.3"))
+ACTIVITY_WINDOW_DAYS = 7
+
+
+def plan_intervals(profiles: List[Dict], budget_per_hour: float) -> Dict[int, int]:
+    """Polling interval (minutes) per profile that fits the request budget.
+
+    ``profiles`` items have ``id``, ``interval`` (requested minutes),
+    ``priority``, ``cost`` (queries per run) and ``activity`` (recent posts).
+    The budget is shared in proportion to priority, boosted by activity;
+    profiles that need less than their share get exactly what they asked for
+    and the rest is split again among the others (water-filling). Intervals
+    only ever grow from the requested ones.
+    """
+    demand = {p["id"]: p["cost"] * 60 / p["interval"] for p in profiles}
+    weight = {p["id"]: p["priority"] * (1 + math.log1p(p["activity"])) for p in profiles}
+    rates: Dict[int, float] = {}
+    remaining = budget_per_hour
+    pending = set(demand)
+    while pending:
+        total_weight = sum(weight[i] for i in pending)
+        satisfied = {i for i in pending if demand[i] <= remaining * weight[i] / total_weight}
+        if not satisfied:
+            for i in pending:
+                rates[i] = remaining * weight[i] / total_weight
+            break
+        for i in satisfied:
+            rates[i] = demand[i]
+            remaining -= demand[i]
+        pending -= satisfied
+    
+    intervals = {}
+    for p in profiles:
+        rate = rates[p["id"]]
+        planned = math.ceil(p["cost"] * 60 / rate) if rate > 0 else PLANNER_MAX_INTERVAL_MINUTES
+        intervals[p["id"]] = min(max(p["interval"], planned), max(p["interval"], PLANNER_MAX_INTERVAL_MINUTES))
+    return intervals
+
+
+def request_budget(session: Session) -> int:
+    """Hourly budget of the account the scraper uses"""
+    account = session.exec(select(InstagramAccount.id).where(InstagramAccount.is_active == True)).first()
+    return INSTAGRAM_REQUESTS_PER_HOUR if account else ANONYMOUS_REQUESTS_PER_HOUR
+
+
+def profile_lane(profile: Profile) -> str:
+    return "critical" if profile.slo_minutes else "standard"
+
+
+def plan_profiles() -> Dict[int, Dict]:
+    """Plan every active profile from its settings and measured history,
+    saving the interval as ``Profile.planned_interval``.
+
+    Returns ``{"interval", "requested", "lane", "target"}`` per profile id,
+    ``target`` being the SLO, or the planned interval without one. Critical
+    profiles ask for their SLO (when shorter than check_interval) and are
+    planned first, within CRITICAL_BUDGET_SHARE of the budget.
+    """
+    since = datetime.utcnow() - timedelta(days=ACTIVITY_WINDOW_DAYS)
+    with Session(engine) as session:
+        activity = dict(session.exec(
+            select(Post.profile_id, func.count(Post.id))
+            .where(Post.created_at >= since)
+            .group_by(Post.profile_id)
+        ).all())
+        rows = session.exec(select(Profile).where(Profile.is_active == True)).all()
+        lanes = {"critical": [], "standard": []}
+        for profile in rows:
+            lanes[profile_lane(profile)].append({
+                "id": profile.id,
+                "interval": max(min(profile.check_interval, profile.slo_minutes or profile.check_interval), 1),
+                "priority": max(profile.priority, 1),
+                "cost": profile.avg_requests_per_run or DEFAULT_REQUESTS_PER_RUN,
+                "activity": activity.get(profile.id, 0),
+            })
+        
+        budget = request_budget(session)
+        standard_demand = sum(p["cost"] * 60 / p["interval"] for p in lanes["standard"])
+        critical_budget = max(budget * CRITICAL_BUDGET_SHARE, budget - standard_demand)
+        intervals = plan_intervals(lanes["critical"], critical_budget)
+        used = sum(p["cost"] * 60 / intervals[p["id"]] for p in lanes["critical"])
+        intervals.update(plan_intervals(lanes["standard"], max(budget - used, 0)))
+        
+        for profile in rows:
+            if profile.planned_interval != intervals[profile.id]:
+                profile.planned_interval = intervals[profile.id]
+                session.add(profile)
+        session.commit()
+        slo = {profile.id: profile.slo_minutes for profile in rows}
+        return {
+            p["id"]: {
+                "interval": intervals[p["id"]],
+                "requested": p["interval"],
+                "lane": lane,
+                "target": slo[p["id"]] or intervals[p["id"]],
+            }
+            for lane, plans in lanes.items() for p in plans
+        }
@@ -0,0 +1,108 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from sqlalchemy import delete, text
+from sqlmodel import select
+from .models import LogRollup, ScrapeRun, SystemLog
+from .database import Session, engine, logs_engine
+import os
+import re
+import time
+
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "14"))
+LOG_PRUNE_CHUNK = int(os.getenv("LOG_PRUNE_CHUNK", "2000"))
+# Pause between chunks so scraper writes get the lock in between
+LOG_PRUNE_PAUSE = 0.05
+# Pages returned to the filesystem per run by PRAGMA incremental_vacuum
+VACUUM_PAGES_PER_RUN = int(os.getenv("VACUUM_PAGES_PER_RUN", "5000"))
+
+_USERNAME = re.compile(r"@[\w.]+")
+_NUMBER = re.compile(r"\d+")
+
+
+def message_kind(message: str) -> str:
+    """Group messages that only differ in usernames and numbers"""
+    return _NUMBER.sub("#", _USERNAME.sub("@*", message))[:120]
+
+
+def _hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _rollup_chunk(session: Session, cutoff: datetime) -> int:
+    """Fold the oldest chunk of expired logs into LogRollup and delete them.
+
+    Each chunk is its own short transaction; returns the number of rows pruned.
+    """
+    rows = session.exec(
+        select(SystemLog.id, SystemLog.created_at, SystemLog.level, SystemLog.profile_id, SystemLog.message)
+        .where(SystemLog.created_at < cutoff)
+        .order_by(SystemLog.id)
+        .limit(LOG_PRUNE_CHUNK)
+    ).all()
+    if not rows:
+        return 0
+    
+    counts: Counter = Counter(
+        (_hour(created_at), level, profile_id, message_kind(message))
+        for _, created_at, level, profile_id, message in rows
+    )
+    hours = {key[0] for key in counts}
+    existing: Dict[Tuple, LogRollup] = {
+        (r.hour, r.level, r.profile_id, r.kind): r
+        for r in session.exec(select(LogRollup).where(LogRollup.hour.in_(hours))).all()
+    }
+    for key, count in counts.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            hour, level, profile_id, kind = key
+            rollup = LogRollup(hour=hour, level=level, profile_id=profile_id, kind=kind)
+        rollup.count += count
+        session.add(rollup)
+    
+    session.exec(delete(SystemLog).where(SystemLog.id.in_([row[0] for row in rows])))
+    session.commit()
+    return len(rows)
+
+
+def _incremental_vacuum() -> Optional[str]:
+    """Return freed pages to the filesystem a few at a time.
+
+    Databases created before auto_vacuum=INCREMENTAL need one full VACUUM to
+    switch modes; that happens once, on the first run.
+    """
+    with logs_engine.connect() as conn:
+        mode = conn.execute(text("PRAGMA auto_vacuum")).scalar()
+        if mode != 2:
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+            conn.execute(text("VACUUM"))
+            return "full"
+        conn.execute(text(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_RUN})"))
+        return "incremental"
+
+
+def prune_logs(retention_days: int = LOG_RETENTION_DAYS) -> Dict:
+    """Roll up and delete logs older than ``retention_days``, then vacuum"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    pruned = 0
+    with Session(engine) as session:
+        while True:
+            count = _rollup_chunk(session, cutoff)
+            pruned += count
+            if count < LOG_PRUNE_CHUNK:
+                break
+            time.sleep(LOG_PRUNE_PAUSE)
+        # Run records only feed SLO stats; they are dropped without a rollup
+        session.exec(delete(ScrapeRun).where(ScrapeRun.started_at < cutoff))
+        session.commit()
+    
+    vacuum = _incremental_vacuum() if pruned else None
+    if pruned:
+        with Session(engine) as session:
+            session.add(SystemLog(
+                level="info",
+                message=f"Retenção de logs: {pruned} registros antigos resumidos por hora",
+                details=f"Mais antigos que {retention_days} dias, vacuum: {vacuum}"
+            ))
+            session.commit()
+    return {"pruned": pruned, "vacuum": vacuum}
@@ -1,45 +1,151 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from datetime import datetime
-from sqlmodel import Session, select
-from .models import Profile, SystemLog
-from .database import engine
-from .scraper import InstagramScraper
-from .webhook import WebhookManager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func
+from sqlmodel import select
+from .models import Profile, SystemLog, BackfillState, JobSchedule, ScrapeRun
+from .database import Session, engine
+from .delivery import DeliveryManager
+from .retention import prune_logs
+from .planner import plan_profiles
+from typing import Dict, List, Optional, Tuple
 import asyncio
+import os
+import threading
+import uuid
 
-# Create a single global instance of the scraper to maintain session
+BACKFILL_INTERVAL_MINUTES = int(os.getenv("BACKFILL_INTERVAL_MINUTES", "15"))
+# Scrape-to-delivery pipeline: posts waiting for delivery before the scraper
+# blocks, and how many deliver concurrently (1 keeps the feed order)
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "1"))
+PIPELINE_LOOP_CHECK_SECONDS = 1.0
+# Next run times are saved every SCHEDULE_SAVE_SECONDS and on shutdown; jobs
+# overdue after a restart run once, spread over SCHEDULER_CATCHUP_SECONDS
+SCHEDULE_SAVE_SECONDS = int(os.getenv("SCHEDULE_SAVE_SECONDS", "60"))
+SCHEDULER_CATCHUP_SECONDS = int(os.getenv("SCHEDULER_CATCHUP_SECONDS", "300"))
+MAINTENANCE_JOB_IDS = ["backfill_task", "cleanup_task", "log_retention_task"]
+# Intervals are re-planned on profile changes and this often, as costs and
+# activity change
+PLANNER_INTERVAL_MINUTES = int(os.getenv("PLANNER_INTERVAL_MINUTES", "60"))
+# Scrape threads per lane: critical profiles (with an SLO) never wait behind
+# standard ones or backfill
+CRITICAL_LANE_WORKERS = int(os.getenv("CRITICAL_LANE_WORKERS", "2"))
+STANDARD_LANE_WORKERS = int(os.getenv("STANDARD_LANE_WORKERS", "2"))
+
+# Create a single global instance of the scraper to maintain session.
+# It is built on first use (importing instaloader, loading the session file
+# and test_login() are slow), normally by warm_scraper() right after startup.
 _scraper_instance = None
+_scraper_lock = threading.Lock()
+scraper_state = {"status": "pending", "error": None}  # "pending", "warming", "ready", "failed"
 
 def get_scraper():
     global _scraper_instance
     if _scraper_instance is None:
-        _scraper_instance = InstagramScraper()
+        with _scraper_lock:
+            if _scraper_instance is None:
+                scraper_state.update(status="warming", error=None)
+                try:
+                    from .scraper import InstagramScraper
+                    _scraper_instance = InstagramScraper()
+                except Exception as e:
+                    scraper_state.update(status="failed", error=str(e))
+                    raise
+                scraper_state["status"] = "ready"
     return _scraper_instance
 
 
+def warm_scraper():
+    """Build the scraper ahead of the first scrape; failures are retried on next use"""
+    try:
+        get_scraper()
+    except Exception as e:
+        with Session(engine) as session:
+            session.add(SystemLog(level="error", message="Falha ao inicializar o scraper", details=str(e)))
+            session.commit()
+
+
 class TaskScheduler:
     def __init__(self, base_url: str):
         self.scheduler = AsyncIOScheduler()
-        self.scraper = get_scraper()  # Use singleton instance
-        self.webhook_manager = WebhookManager(base_url)
+        self.delivery = DeliveryManager(base_url)
         self.jobs = {}
+        self.intervals: Dict[int, int] = {}  # Requested by the profile
+        self.planned: Dict[int, int] = {}  # Scheduled within the request budget
+        # Held while changing profile jobs or planning: API handlers call in
+        # from the threadpool, so two requests may touch the same job at once
+        self._plan_lock = threading.RLock()
+        self._stretched: List[int] = []  # Profiles planned above their check_interval
+        self.lanes: Dict[int, str] = {}  # Lane per profile, from the planner
+        self.targets: Dict[int, int] = {}  # SLO target per profile (minutes)
+        self.executors = {
+            "critical": ThreadPoolExecutor(CRITICAL_LANE_WORKERS, thread_name_prefix="lane-critical"),
+            "standard": ThreadPoolExecutor(STANDARD_LANE_WORKERS, thread_name_prefix="lane-standard"),
+        }
+        # Latest run per profile; a run whose task is not done is in flight
+        self.runs: Dict[int, Dict] = {}
+        # First run time per job id, restored from JobSchedule on start
+        self.start_dates: Dict[str, datetime] = {}
+        # Set once start() has added every job; until then a missing job
+        # is not a removed one and its saved timer must be kept
+        self._jobs_loaded = False
+    
+    @property
+    def scraper(self):
+        """Singleton scraper; only touch it from executor threads, it may still be warming up"""
+        return get_scraper()
         
-    def start(self):
+    async def start(self):
         """Start the scheduler and load all active profiles"""
         self.scheduler.start()
-        self._load_all_profiles()
+        # Reads profiles and plans them: SQLite work, kept off the event loop
+        await asyncio.get_event_loop().run_in_executor(None, self._load_all_profiles)
+        # Backfill history in small chunks, at lower priority than live polling
+        self.scheduler.add_job(
+            self._run_backfill,
+            IntervalTrigger(minutes=BACKFILL_INTERVAL_MINUTES, start_date=self.start_dates.pop("backfill_task", None)),
+            id="backfill_task",
+            name="Backfill profile history"
+        )
         # Schedule cleanup task every 6 hours
         self.scheduler.add_job(
             self._cleanup_old_media,
-            IntervalTrigger(hours=6),
+            IntervalTrigger(hours=6, start_date=self.start_dates.pop("cleanup_task", None)),
             id="cleanup_task",
             name="Cleanup old media files"
         )
+        # Roll up and prune old logs every hour
+        self.scheduler.add_job(
+            self._prune_logs,
+            IntervalTrigger(hours=1, start_date=self.start_dates.pop("log_retention_task", None)),
+            id="log_retention_task",
+            name="Prune old system logs"
+        )
+        self.scheduler.add_job(
+            self._replan_task,
+            IntervalTrigger(minutes=PLANNER_INTERVAL_MINUTES),
+            id="planner_task",
+            name="Plan polling within the request budget"
+        )
+        self.scheduler.add_job(
+            self._save_schedule,
+            IntervalTrigger(seconds=SCHEDULE_SAVE_SECONDS),
+            id="schedule_save_task",
+            name="Save next run times"
+        )
+        self._jobs_loaded = True
         
     def stop(self):
         """Stop the scheduler"""
-        self.scheduler.shutdown()
+        if self.scheduler.running:
+            if self._jobs_loaded:
+                self._save_next_runs()
+            self.scheduler.shutdown()
+        for executor in self.executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.delivery.shutdown()
     
     def _load_all_profiles(self):
         """Load all active profiles and schedule their tasks"""
@@ -47,90 +153,359 @@ class TaskScheduler:
             profiles = session.exec(
                 select(Profile).where(Profile.is_active == True)
             ).all()
+            saved = {row.job_id: row.next_run_time for row in session.exec(select(JobSchedule)).all()}
+            job_ids = [f"profile_{profile.id}" for profile in profiles] + MAINTENANCE_JOB_IDS
+            self.start_dates = self._restore_start_dates(saved, job_ids)
             
             for profile in profiles:
-                self.add_profile_job(profile.id, profile.check_interval)
+                self._schedule_profile(profile.id, profile.check_interval, profile.planned_interval)
+        self.replan()
+    
+    @staticmethod
+    def _restore_start_dates(saved: Dict[str, datetime], job_ids: List[str]) -> Dict[str, datetime]:
+        """First run times for jobs with a saved next run.
+
+        Future runs are kept as they were. Runs missed while the app was down
+        happen once, most overdue first, spread evenly over
+        SCHEDULER_CATCHUP_SECONDS so a restart does not scrape every profile
+        at the same moment. Jobs never saved start a full interval from now.
+        """
+        now = datetime.now(timezone.utc)
+        start_dates = {}
+        overdue = []
+        for job_id in job_ids:
+            if job_id not in saved:
+                continue
+            next_run = saved[job_id].replace(tzinfo=timezone.utc)
+            if next_run > now:
+                start_dates[job_id] = next_run
+            else:
+                overdue.append((next_run, job_id))
+        
+        step = SCHEDULER_CATCHUP_SECONDS / max(len(overdue), 1)
+        for index, (_, job_id) in enumerate(sorted(overdue)):
+            # Always in the future: a start_date already past would skip a whole interval
+            start_dates[job_id] = now + timedelta(seconds=step * (index + 1))
+        return start_dates
+    
+    def _save_next_runs(self):
+        """Store every job's next run time, dropping rows of removed jobs"""
+        next_runs = {
+            job.id: job.next_run_time.astimezone(timezone.utc).replace(tzinfo=None)
+            for job in self.scheduler.get_jobs()
+            if job.next_run_time and job.id != "schedule_save_task"
+        }
+        with Session(engine) as session:
+            for row in session.exec(select(JobSchedule)).all():
+                if row.job_id not in next_runs:
+                    session.delete(row)
+            for job_id, next_run in next_runs.items():
+                session.merge(JobSchedule(job_id=job_id, next_run_time=next_run, updated_at=datetime.utcnow()))
+            session.commit()
+    
+    async def _save_schedule(self):
+        """Run the next-run snapshot task"""
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(None, self._save_next_runs)
+        except Exception as e:
+            await loop.run_in_executor(None, self._log, "error", "Failed to save job schedule", str(e))
     
     def add_profile_job(self, profile_id: int, interval_minutes: int):
-        """Add or update a job for a profile"""
+        """Add or update a job for a profile, then re-plan the request budget"""
+        with self._plan_lock:
+            self._schedule_profile(profile_id, interval_minutes, self.planned.get(profile_id))
+            self.replan()
+    
+    def _schedule_profile(self, profile_id: int, interval_minutes: int, planned_minutes: Optional[int] = None):
         job_id = f"profile_{profile_id}"
-        
-        # Remove existing job if any
-        if job_id in self.jobs:
-            self.scheduler.remove_job(job_id)
-        
-        # Add new job
-        job = self.scheduler.add_job(
-            self._run_profile_scrape,
-            IntervalTrigger(minutes=interval_minutes),
-            args=[profile_id],
-            id=job_id,
-            name=f"Scrape profile {profile_id}"
-        )
-        
-        self.jobs[job_id] = job
+        with self._plan_lock:
+            # Remove existing job if any
+            if job_id in self.jobs:
+                self.scheduler.remove_job(job_id)
+            
+            # Add new job, resuming its saved timer on start
+            minutes = planned_minutes or interval_minutes
+            job = self.scheduler.add_job(
+                self._scheduled_scrape,
+                IntervalTrigger(minutes=minutes, start_date=self.start_dates.pop(job_id, None)),
+                args=[profile_id],
+                id=job_id,
+                name=f"Scrape profile {profile_id}"
+            )
+            
+            self.jobs[job_id] = job
+            self.intervals[profile_id] = interval_minutes
+            self.planned[profile_id] = minutes
     
     def remove_profile_job(self, profile_id: int):
-        """Remove a profile's job"""
+        """Remove a profile's job; its share of the budget goes to the others"""
         job_id = f"profile_{profile_id}"
-        if job_id in self.jobs:
-            self.scheduler.remove_job(job_id)
-            del self.jobs[job_id]
+        with self._plan_lock:
+            if job_id in self.jobs:
+                self.scheduler.remove_job(job_id)
+                del self.jobs[job_id]
+            self.intervals.pop(profile_id, None)
+            self.planned.pop(profile_id, None)
+            self.lanes.pop(profile_id, None)
+            self.targets.pop(profile_id, None)
+            self.replan()
     
-    async def _run_profile_scrape(self, profile_id: int):
-        """Run scrape for a specific profile"""
+    def replan(self):
+        """Fit every profile's polling into the Instagram request budget.
+
+        Jobs whose planned interval changed keep their next run, or move it
+        closer when the new interval is shorter.
+        """
+        with self._plan_lock:
+            planned = plan_profiles()
+            now = datetime.now(timezone.utc)
+            for profile_id, plan in planned.items():
+                job_id = f"profile_{profile_id}"
+                job = self.scheduler.get_job(job_id)
+                if job is None:
+                    continue
+                minutes = plan["interval"]
+                self.planned[profile_id] = minutes
+                self.lanes[profile_id] = plan["lane"]
+                self.targets[profile_id] = plan["target"]
+                if job.trigger.interval == timedelta(minutes=minutes):
+                    continue
+                next_run = job.next_run_time
+                if next_run is not None:
+                    next_run = min(next_run, now + timedelta(minutes=minutes))
+                self.scheduler.modify_job(
+                    job_id,
+                    trigger=IntervalTrigger(minutes=minutes, start_date=next_run),
+                    next_run_time=next_run
+                )
+            
+            stretched = [pid for pid, plan in planned.items() if plan["interval"] > plan["requested"]]
+            if stretched and stretched != self._stretched:
+                self._log("warning", "Orçamento de requisições do Instagram excedido",
+                          f"{len(stretched)} perfil(is) checado(s) com intervalo maior que o configurado")
+            self._stretched = stretched
+    
+    async def _replan_task(self):
+        """Run the budget planner"""
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(None, self.replan)
+        except Exception as e:
+            await loop.run_in_executor(None, self._log, "error", "Request budget planning failed", str(e))
+    
+    def _start_run(self, profile_id: int, trigger: str) -> Tuple[Dict, bool]:
+        """Start a scrape unless one is already in flight; returns (run, created).
+
+        Must be called on the event loop, which makes the check-and-start atomic.
+        """
+        run = self.runs.get(profile_id)
+        if run and not run["task"].done():
+            return run, False
+        
+        run = {
+            "run_id": uuid.uuid4().hex[:12],
+            "profile_id": profile_id,
+            "trigger": trigger,
+            "status": "running",
+            "started_at": datetime.utcnow().isoformat(),
+            "finished_at": None,
+        }
+        run["task"] = asyncio.create_task(self._execute_run(run))
+        self.runs[profile_id] = run
+        return run, True
+    
+    async def _execute_run(self, run: Dict):
         try:
-            # Run scraper in thread pool to avoid blocking
+            await self._run_profile_scrape(run["profile_id"])
+            run["status"] = "completed"
+        except Exception:
+            run["status"] = "failed"
+        finally:
+            run["finished_at"] = datetime.utcnow().isoformat()
             loop = asyncio.get_event_loop()
-            new_media = await loop.run_in_executor(
-                None,
-                self.scraper.scrape_profile,
-                profile_id
+            try:
+                await loop.run_in_executor(None, self._record_run, run)
+            except Exception as e:
+                await loop.run_in_executor(
+                    None, self._log, "error", "Failed to record run", str(e), run["profile_id"]
+                )
+    
+    def _record_run(self, run: Dict):
+        """Store a finished run with how late it was against the profile's target"""
+        profile_id = run["profile_id"]
+        started_at = datetime.fromisoformat(run["started_at"])
+        target = self.targets.get(profile_id) or self.planned.get(profile_id) or 0
+        with Session(engine) as session:
+            previous = session.exec(
+                select(func.max(ScrapeRun.started_at)).where(ScrapeRun.profile_id == profile_id)
+            ).one()
+            gap = (started_at - previous).total_seconds() if previous else None
+            session.add(ScrapeRun(
+                profile_id=profile_id,
+                lane=self.lanes.get(profile_id, "standard"),
+                trigger=run["trigger"],
+                status=run["status"],
+                target_minutes=target,
+                gap_seconds=gap,
+                late_seconds=max(gap - target * 60, 0.0) if gap is not None else None,
+                started_at=started_at,
+                finished_at=datetime.fromisoformat(run["finished_at"])
+            ))
+            session.commit()
+    
+    @staticmethod
+    def run_info(run: Optional[Dict]) -> Optional[Dict]:
+        if run is None:
+            return None
+        return {key: value for key, value in run.items() if key != "task"}
+    
+    def get_run(self, profile_id: int) -> Optional[Dict]:
+        """Current or last run for a profile"""
+        return self.run_info(self.runs.get(profile_id))
+    
+    async def _scheduled_scrape(self, profile_id: int):
+        """Interval job: joins a manual run already in flight instead of starting another"""
+        run, _ = self._start_run(profile_id, "scheduled")
+        await asyncio.shield(run["task"])
+    
+    def _log(self, level: str, message: str, details: str = None, profile_id: int = None):
+        with Session(engine) as session:
+            log_entry = SystemLog(
+                level=level,
+                message=message,
+                details=details,
+                profile_id=profile_id
             )
-            
-            # Send webhooks if there's new media
-            if new_media:
-                with Session(engine) as session:
-                    profile = session.get(Profile, profile_id)
-                    if profile:
-                        await loop.run_in_executor(
-                            None,
-                            self.webhook_manager.process_new_media,
-                            new_media,
-                            profile.webhook_url,
-                            profile.username
-                        )
-                        
-        except Exception as e:
-            with Session(engine) as session:
-                log_entry = SystemLog(
-                    level="error",
-                    message=f"Scheduled scrape failed for profile {profile_id}",
-                    details=str(e),
-                    profile_id=profile_id
+            session.add(log_entry)
+            session.commit()
+    
+    async def _deliver(self, profile_id: int, new_media: list, lane: str):
+        await self.delivery.deliver(profile_id, new_media, lane)
+    
+    async def _delivery_worker(self, profile_id: int, queue: asyncio.Queue, lane: str):
+        while True:
+            items = await queue.get()
+            if items is None:
+                return
+            try:
+                await self._deliver(profile_id, items, lane)
+            except Exception as e:
+                loop = asyncio.get_event_loop()
+                await loop.run_in_executor(
+                    None, self._log, "error", f"Delivery failed for profile {profile_id}", str(e), profile_id
                 )
-                session.add(log_entry)
-                session.commit()
+    
+    async def _run_pipeline(self, profile_id: int, scrape, lane: str = "standard"):
+        """Run ``scrape(on_media)`` on the lane's threads while delivering its media.
+
+        Each post or story item goes through a bounded queue to the delivery
+        workers as soon as it is downloaded. When the queue is full the
+        scraper thread waits, so memory stays bounded on bursts. Delivery
+        runs on the lane's own pool in ``DeliveryManager``, so the lane
+        covers detection through delivery.
+        """
+        loop = asyncio.get_event_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        
+        def on_media(items):
+            # Called from the scraper thread. Waits while the queue is full,
+            # but not for a loop that stopped: the put would never complete
+            # and the thread would hang shutdown
+            future = asyncio.run_coroutine_threadsafe(queue.put(items), loop)
+            while True:
+                try:
+                    return future.result(timeout=PIPELINE_LOOP_CHECK_SECONDS)
+                except FutureTimeoutError:
+                    if not loop.is_running():
+                        future.cancel()
+                        raise RuntimeError("Event loop stopped, delivery pipeline closed")
+        
+        workers = [
+            asyncio.create_task(self._delivery_worker(profile_id, queue, lane)) for _ in range(PIPELINE_WORKERS)
+        ]
+        try:
+            await loop.run_in_executor(self.executors[lane], scrape, on_media)
+        finally:
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+    
+    async def _run_profile_scrape(self, profile_id: int):
+        """Run scrape for a specific profile; errors are logged and re-raised"""
+        # Everything blocking (Instagram, SQLite, webhooks) runs in the thread
+        # pool so the event loop keeps serving the API and WebSockets
+        loop = asyncio.get_event_loop()
+        try:
+            await self._run_pipeline(
+                profile_id,
+                lambda on_media: self.scraper.scrape_profile(profile_id, on_media),
+                self.lanes.get(profile_id, "standard")
+            )
+        except Exception as e:
+            await loop.run_in_executor(
+                None, self._log, "error",
+                f"Scheduled scrape failed for profile {profile_id}", str(e), profile_id
+            )
+            raise
+    
+    def _next_backfill_profile(self) -> Optional[int]:
+        """Pending backfill that waited longest, for an active profile"""
+        with Session(engine) as session:
+            return session.exec(
+                select(BackfillState.profile_id)
+                .join(Profile, Profile.id == BackfillState.profile_id)
+                .where(BackfillState.status == "pending", Profile.is_active == True)
+                .order_by(BackfillState.updated_at)
+                .limit(1)
+            ).first()
+    
+    async def _run_backfill(self):
+        """Run one backfill chunk, only while no live scrape is in flight"""
+        if any(not run["task"].done() for run in self.runs.values()):
+            return
+        loop = asyncio.get_event_loop()
+        profile_id = await loop.run_in_executor(None, self._next_backfill_profile)
+        if profile_id is None or profile_id in self.runs and not self.runs[profile_id]["task"].done():
+            return
+        try:
+            await self._run_pipeline(
+                profile_id,
+                lambda on_media: self.scraper.backfill_profile(profile_id, on_media),
+                "standard"
+            )
+        except Exception as e:
+            await loop.run_in_executor(
+                None, self._log, "error", f"Backfill failed for profile {profile_id}", str(e), profile_id
+            )
     
     async def _cleanup_old_media(self):
         """Run media cleanup task"""
+        loop = asyncio.get_event_loop()
         try:
-            loop = asyncio.get_event_loop()
             await loop.run_in_executor(
                 None,
-                self.scraper.cleanup_old_media,
-                24  # Clean files older than 24 hours
+                lambda: self.scraper.cleanup_old_media(24)  # Clean files older than 24 hours
             )
         except Exception as e:
-            with Session(engine) as session:
-                log_entry = SystemLog(
-                    level="error",
-                    message="Media cleanup failed",
-                    details=str(e)
-                )
-                session.add(log_entry)
-                session.commit()
+            await loop.run_in_executor(None, self._log, "error", "Media cleanup failed", str(e))
     
-    async def force_check(self, profile_id: int):
-        """Force an immediate check for a profile"""
-        await self._run_profile_scrape(profile_id)
\ No newline at end of file
+    async def _prune_logs(self):
+        """Run log retention task"""
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(None, prune_logs)
+        except Exception as e:
+            await loop.run_in_executor(None, self._log, "error", "Log retention failed", str(e))
+    
+    def force_check(self, profile_id: int) -> Dict:
+        """Force an immediate check for a profile without waiting for it.
+
+        Concurrent triggers join the run already in flight. A new manual run
+        pushes the profile's next interval run a full interval from now.
+        """
+        run, created = self._start_run(profile_id, "manual")
+        job_id = f"profile_{profile_id}"
+        if created and job_id in self.jobs and profile_id in self.planned:
+            self.scheduler.reschedule_job(job_id, trigger=IntervalTrigger(minutes=self.planned[profile_id]))
+        return {**self.run_info(run), "joined": not created}
\ No newline at end of file
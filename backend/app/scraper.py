@@ -1,20 +1,78 @@
 import instaloader
-from datetime import datetime, timezone
+from datetime import datetime
 import os
 from pathlib import Path
 import base64
-from typing import List, Dict, Optional
-from sqlmodel import Session, select
-from .models import Profile, MediaLog, SystemLog, InstagramAccount
-from .database import engine
+import hashlib
+from typing import Callable, List, Dict, Optional, Tuple
+from sqlalchemy import insert
+from sqlmodel import select
+from .models import Profile, Post, MediaItem, SystemLog, InstagramAccount, BackfillState
+from .database import Session, engine
+from .stats import stats_tracker
+from .variants import is_variant, variant_generator
 import shutil
 import time
-from instaloader.exceptions import ConnectionException, LoginRequiredException, BadCredentialsException
+from instaloader.exceptions import ConnectionException, LoginRequiredException, BadCredentialsException, InvalidArgumentException
+from instaloader.instaloadercontext import RateController
+from instaloader.nodeiterator import FrozenNodeIterator
 from passlib.context import CryptContext
+import itertools
+import json
+import threading
+
+# Incremental post scan limits (see InstagramScraper._scrape_posts)
+POSSIBLY_PINNED = 3  # Up to 3 posts can be pinned at the top of the feed
+POSTS_STOP_AFTER_SEEN = int(os.getenv("POSTS_STOP_AFTER_SEEN", "3"))
+POSTS_MAX_PAGES_PER_RUN = int(os.getenv("POSTS_MAX_PAGES_PER_RUN", "2"))
+RECENT_SHORTCODES_KEPT = 50
+BACKFILL_CHUNK_POSTS = int(os.getenv("BACKFILL_CHUNK_POSTS", "24"))
+
+# Story reels of all tracked users are fetched in one batched query and
+# reused for this many seconds (see InstagramScraper._get_story_reel)
+STORY_REELS_TTL = int(os.getenv("STORY_REELS_TTL", "120"))
+# Weight of the latest run in a profile's avg_requests_per_run
+REQUEST_COST_SMOOTHING = 0.3
+
+
+def _is_pinned(post) -> bool:
+    """Pinned flag from either the GraphQL node or the iPhone API struct"""
+    if post.is_pinned:
+        return True
+    iphone_struct = post._node.get("iphone_struct") or {}
+    return bool(iphone_struct.get("timeline_pinned_user_ids"))
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CountingRateController(RateController):
+    """instaloader's rate controller, also counting queries per thread.
+
+    Only API queries pass through it (not CDN file downloads), which is what
+    Instagram rate-limits; each scrape runs in its own executor thread.
+    """
+    
+    def __init__(self, context):
+        super().__init__(context)
+        self._local = threading.local()
+    
+    def wait_before_query(self, query_type: str) -> None:
+        super().wait_before_query(query_type)
+        self._local.queries = self.thread_queries() + 1
+    
+    def thread_queries(self) -> int:
+        return getattr(self._local, "queries", 0)
 
 
 class InstagramScraper:
     def __init__(self):
+        self.rate_controller: Optional[CountingRateController] = None
         self.loader = instaloader.Instaloader(
             dirname_pattern="{target}",
             filename_pattern="{date_utc}_UTC_{typename}",
@@ -23,7 +81,8 @@ class InstagramScraper:
             compress_json=False,
             download_geotags=False,
             download_video_thumbnails=False,
-            quiet=True
+            quiet=True,
+            rate_controller=self._make_rate_controller
         )
         self.media_dir = Path(__file__).parent.parent / "media"
         self.media_dir.mkdir(exist_ok=True)
@@ -31,8 +90,21 @@ class InstagramScraper:
         self.sessions_dir.mkdir(exist_ok=True)
         self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
         
+        # Batched story reel pre-check: {userid: Story} for users with a live reel
+        self._story_reels: Dict[int, instaloader.Story] = {}
+        self._story_reels_userids: set = set()
+        self._story_reels_at = 0.0
+        self._story_reels_lock = threading.Lock()
+        
         # Try to login with stored credentials
         self._init_session()
+        
+        if variant_generator.names and not variant_generator.available:
+            self.log("warning", "Variantes de mídia desativadas", "MEDIA_VARIANTS requer Pillow instalado")
+    
+    def _make_rate_controller(self, context) -> CountingRateController:
+        self.rate_controller = CountingRateController(context)
+        return self.rate_controller
     
     def _init_session(self):
         """Initialize Instagram session with stored credentials"""
@@ -43,20 +115,20 @@ class InstagramScraper:
             ).first()
             
             if not account:
-                self.log(db_session, "warning", "No active Instagram account configured", 
+                self.log("warning", "No active Instagram account configured", 
                         "Bot will use anonymous access with strict rate limits")
                 return
             
-            self.log(db_session, "info", f"Found Instagram account: @{account.username}", 
+            self.log("info", f"Found Instagram account: @{account.username}", 
                     f"Session file: {account.session_file}")
             
             try:
                 # Try to load existing session
                 session_file = self.sessions_dir / f"{account.username}.session"
-                self.log(db_session, "info", f"Looking for session file", f"Path: {session_file}")
+                self.log("info", f"Looking for session file", f"Path: {session_file}")
                 
                 if session_file.exists():
-                    self.log(db_session, "info", "Session file found, attempting to load")
+                    self.log("info", "Session file found, attempting to load")
                     try:
                         # Load session using just the username
                         self.loader.load_session_from_file(account.username, sessionfile=str(self.sessions_dir))
@@ -66,38 +138,38 @@ class InstagramScraper:
                         username = self.loader.test_login()
                         context_username = self.loader.context.username
                         
-                        self.log(db_session, "info", 
+                        self.log("info", 
                                 f"Session load result", 
                                 f"is_logged_in: {is_logged_in}, test_login: {username}, context.username: {context_username}")
                         
                         if username and is_logged_in:
-                            self.log(db_session, "info", f"✅ Successfully loaded session for @{username}")
+                            self.log("info", f"✅ Successfully loaded session for @{username}")
                             account.last_login = datetime.utcnow()
                             db_session.add(account)
                             db_session.commit()
                             return
                         else:
-                            self.log(db_session, "warning", "Session file exists but not logged in",
+                            self.log("warning", "Session file exists but not logged in",
                                     f"is_logged_in: {is_logged_in}, username: {username}")
                     except Exception as e:
-                        self.log(db_session, "error", f"Failed to load session for @{account.username}", 
+                        self.log("error", f"Failed to load session for @{account.username}", 
                                 f"Error: {str(e)}, Type: {type(e).__name__}")
                 
                 # If no valid session, we need the plain password
                 # The login should be done via the API endpoint with proper password verification
-                self.log(db_session, "info", 
+                self.log("info", 
                         f"No valid session for @{account.username}", 
                         "Please use the API to login and save a session")
                     
             except BadCredentialsException:
-                self.log(db_session, "error", f"Invalid credentials for @{account.username}")
+                self.log("error", f"Invalid credentials for @{account.username}")
                 account.is_active = False
                 db_session.add(account)
                 db_session.commit()
             except ConnectionException as e:
-                self.log(db_session, "error", f"Connection error during login", str(e))
+                self.log("error", f"Connection error during login", str(e))
             except Exception as e:
-                self.log(db_session, "error", f"Unexpected error during login", str(e))
+                self.log("error", f"Unexpected error during login", str(e))
     
     def login_with_account(self, account_id: int, password: str) -> bool:
         """Login with specific Instagram account"""
@@ -121,14 +193,14 @@ class InstagramScraper:
                 db_session.add(account)
                 db_session.commit()
                 
-                self.log(db_session, "info", f"Successfully logged in as @{account.username}")
+                self.log("info", f"Successfully logged in as @{account.username}")
                 return True
                 
             except BadCredentialsException:
-                self.log(db_session, "error", f"Invalid credentials for @{account.username}")
+                self.log("error", f"Invalid credentials for @{account.username}")
                 return False
             except Exception as e:
-                self.log(db_session, "error", f"Login failed for @{account.username}", str(e))
+                self.log("error", f"Login failed for @{account.username}", str(e))
                 return False
     
     def has_valid_session(self) -> bool:
@@ -138,31 +210,98 @@ class InstagramScraper:
             username = self.loader.test_login()
             return username is not None and is_logged_in
         except Exception as e:
-            with Session(engine) as session:
-                self.log(session, "warning", "Error checking session validity", str(e))
+            self.log("warning", "Error checking session validity", str(e))
             return False
     
-    def log(self, session: Session, level: str, message: str, details: Optional[str] = None, profile_id: Optional[int] = None):
-        log_entry = SystemLog(
-            level=level,
-            message=message,
-            details=details,
-            profile_id=profile_id
-        )
-        session.add(log_entry)
-        session.commit()
+    def log(self, level: str, message: str, details: Optional[str] = None, profile_id: Optional[int] = None):
+        # Own session: logging never commits a scrape's pending changes
+        with Session(engine) as session:
+            log_entry = SystemLog(
+                level=level,
+                message=message,
+                details=details,
+                profile_id=profile_id
+            )
+            session.add(log_entry)
+            session.commit()
+    
+    def _save_media(self, session: Session, post_row: Post, media_files: List[Path], *cursors) -> List[Dict]:
+        """Persist one post or story item and its files, and commit.
+
+        The post row is inserted first for its id, then the files go out as
+        one multi-row INSERT ... RETURNING (the ORM would send one INSERT per
+        row on SQLite to get ids back in order), in the same transaction as
+        the cursor objects (profile, backfill state) updated for them.
+        Returns the files for delivery, with their real MediaItem ids and
+        any variants made for them (``variants.py``).
+        """
+        variants = variant_generator.generate_many(media_files)
+        session.add(post_row)
+        for cursor in cursors:
+            session.add(cursor)
+        rows = [{
+            "media_path": str(media_file),
+            "file_type": "video" if media_file.suffix == ".mp4" else "image",
+            "size_bytes": media_file.stat().st_size,
+            "sha256": _sha256(media_file),
+            "variants": json.dumps(variants[str(media_file)]) if str(media_file) in variants else None,
+            "webhook_sent": False,
+            "created_at": datetime.utcnow()
+        } for media_file in media_files]
+        try:
+            session.flush()
+            # Ids are matched by path since SQLite does not guarantee RETURNING order
+            ids = dict(session.execute(
+                insert(MediaItem)
+                .values([{**row, "post_id": post_row.id} for row in rows])
+                .returning(MediaItem.media_path, MediaItem.id)
+            ).all())
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        
+        return [{
+            "id": ids[row["media_path"]],
+            "post_id": post_row.id,
+            "type": post_row.media_type,
+            "caption": post_row.caption or "",
+            "timestamp": post_row.timestamp.isoformat(),
+            "media_path": row["media_path"],
+            "media_type": row["file_type"],
+            "instagram_id": post_row.instagram_id,
+            "variants": variants.get(row["media_path"], {})
+        } for row in rows]
+    
+    def _emit(self, on_media: Optional[Callable[[List[Dict]], None]], items: List[Dict], new_media: List[Dict]) -> int:
+        """Hand saved media to ``on_media`` as soon as it is downloaded, or
+        collect it in ``new_media`` when there is none; returns the count"""
+        if on_media:
+            if items:
+                on_media(items)
+        else:
+            new_media.extend(items)
+        return len(items)
     
-    def scrape_profile(self, profile_id: int) -> List[Dict]:
+    def scrape_profile(self, profile_id: int, on_media: Optional[Callable[[List[Dict]], None]] = None) -> List[Dict]:
+        """Download a profile's new posts and stories.
+
+        With ``on_media``, each post's (or story item's) media is passed to it
+        as soon as it is downloaded, so delivery can start before the run ends,
+        and nothing is kept: the returned list stays empty.
+        """
         with Session(engine) as session:
             profile = session.get(Profile, profile_id)
             if not profile or not profile.is_active:
                 return []
             
             new_media = []
+            found = 0
+            queries_before = self.rate_controller.thread_queries()
             
             # Check if we have a valid session
             if not self.has_valid_session():
-                self.log(session, "warning", 
+                self.log("warning", 
                         "No valid Instagram session", 
                         "Using anonymous access - strict rate limits apply. Configure an Instagram account for better performance.",
                         profile_id=profile_id)
@@ -171,27 +310,32 @@ class InstagramScraper:
                 is_logged_in = self.loader.context.is_logged_in
                 username = self.loader.context.username
                 
-                self.log(session, "info", 
+                self.log("info", 
                         f"Using authenticated session", 
                         f"Logged in as: {username}, is_logged_in: {is_logged_in}",
                         profile_id=profile_id)
                 
                 # Force reload session if needed
                 if not is_logged_in:
-                    self.log(session, "warning", "Session appears invalid, attempting reload")
+                    self.log("warning", "Session appears invalid, attempting reload")
                     self._init_session()
             
             try:
                 # Get Instagram profile
                 try:
                     ig_profile = instaloader.Profile.from_username(self.loader.context, profile.username)
-                    self.log(session, "info", f"Starting scrape for @{profile.username}", profile_id=profile_id)
+                    if profile.instagram_userid != ig_profile.userid:
+                        profile.instagram_userid = ig_profile.userid
+                        session.add(profile)
+                        session.commit()
+                    self.log("info", f"Starting scrape for @{profile.username}", profile_id=profile_id)
                 except ConnectionException as e:
                     if "401" in str(e) or "Please wait a few minutes" in str(e):
-                        self.log(session, "warning", 
+                        self.log("warning", 
                                 f"Rate limit atingido para @{profile.username}", 
                                 "Instagram está limitando requisições. Aguarde alguns minutos antes de tentar novamente.",
                                 profile_id=profile_id)
+                        stats_tracker.profile_checked(profile_id, error="Rate limit")
                         return []
                     raise
                 
@@ -201,177 +345,313 @@ class InstagramScraper:
                 
                 # Scrape posts if enabled
                 if profile.download_posts:
-                    new_media.extend(self._scrape_posts(session, profile, ig_profile, profile_dir))
+                    found += self._scrape_posts(session, profile, ig_profile, profile_dir, new_media, on_media)
                 
                 # Scrape stories if enabled
                 if profile.download_stories:
-                    new_media.extend(self._scrape_stories(session, profile, ig_profile, profile_dir))
+                    found += self._scrape_stories(session, profile, ig_profile, profile_dir, new_media, on_media)
                 
-                # Update profile timestamps
+                # Update profile timestamps and the cost estimate the planner uses
                 profile.updated_at = datetime.utcnow()
+                queries = self.rate_controller.thread_queries() - queries_before
+                if profile.avg_requests_per_run is None:
+                    profile.avg_requests_per_run = float(queries)
+                else:
+                    profile.avg_requests_per_run += REQUEST_COST_SMOOTHING * (queries - profile.avg_requests_per_run)
                 session.add(profile)
                 session.commit()
                 
-                self.log(session, "info", f"Scrape completed. Found {len(new_media)} new items", profile_id=profile_id)
+                self.log("info", f"Scrape completed. Found {found} new items", profile_id=profile_id)
+                stats_tracker.profile_checked(profile_id)
                 
             except Exception as e:
-                self.log(session, "error", f"Scrape failed for @{profile.username}", str(e), profile_id=profile_id)
+                self.log("error", f"Scrape failed for @{profile.username}", str(e), profile_id=profile_id)
+                stats_tracker.profile_checked(profile_id, error=str(e))
             
             return new_media
     
-    def _scrape_posts(self, session: Session, profile: Profile, ig_profile, profile_dir: Path) -> List[Dict]:
-        new_media = []
-        last_timestamp = profile.last_post_timestamp or datetime.min.replace(tzinfo=timezone.utc)
+    def _scrape_posts(self, session: Session, profile: Profile, ig_profile, profile_dir: Path, new_media: List[Dict],
+                      on_media: Optional[Callable[[List[Dict]], None]] = None) -> int:
+        """Download posts newer than the profile's cursor; returns the files found.
+
+        The feed is newest-first except for pinned posts, which come first with
+        old dates. Pinned (or possibly pinned) posts never end the scan; it stops
+        after POSTS_STOP_AFTER_SEEN consecutive already-seen posts, and never
+        reads more than POSTS_MAX_PAGES_PER_RUN feed pages.
+        """
+        found = 0
+        # instaloader's date_utc is naive UTC
+        last_timestamp = profile.last_post_timestamp or datetime.min
         latest_timestamp = last_timestamp
+        seen_shortcodes = set(json.loads(profile.recent_post_shortcodes or "[]"))
+        scanned_shortcodes = []
+        consecutive_seen = 0
+        
+        try:
+            posts = ig_profile.get_posts()
+            max_posts = POSTS_MAX_PAGES_PER_RUN * posts.page_length()
+            
+            # islice stops before pulling an item (and a page) beyond the cap
+            for index, post in enumerate(itertools.islice(posts, max_posts)):
+                pinned = index < POSSIBLY_PINNED or _is_pinned(post)
+                scanned_shortcodes.append(post.shortcode)
+                
+                if post.shortcode in seen_shortcodes or post.date_utc <= last_timestamp:
+                    if not pinned:
+                        consecutive_seen += 1
+                        if consecutive_seen >= POSTS_STOP_AFTER_SEEN:
+                            break
+                    continue
+                consecutive_seen = 0
+                
+                downloaded = self._download_post(session, profile, post, profile_dir)
+                if not downloaded:
+                    continue
+                # Advance the cursor in the same transaction as the post's media
+                if post.date_utc > latest_timestamp:
+                    latest_timestamp = post.date_utc
+                    profile.last_post_timestamp = latest_timestamp
+                recent = [post.shortcode] + json.loads(profile.recent_post_shortcodes or "[]")
+                profile.recent_post_shortcodes = json.dumps(list(dict.fromkeys(recent))[:RECENT_SHORTCODES_KEPT])
+                saved = self._save_media(session, *downloaded, profile)
+                found += self._emit(on_media, saved, new_media)
+            
+            if len(scanned_shortcodes) >= max_posts and consecutive_seen < POSTS_STOP_AFTER_SEEN:
+                self.log("info", f"Post scan capped at {POSTS_MAX_PAGES_PER_RUN} pages",
+                         f"Scanned {len(scanned_shortcodes)} posts", profile_id=profile.id)
+            
+            # Remember the newest seen shortcodes, downloaded or not
+            recent = list(dict.fromkeys(scanned_shortcodes + json.loads(profile.recent_post_shortcodes or "[]")))
+            profile.recent_post_shortcodes = json.dumps(recent[:RECENT_SHORTCODES_KEPT])
+            session.add(profile)
+            session.commit()
+                
+        except Exception as e:
+            self.log("error", "Error scraping posts", str(e), profile_id=profile.id)
+        
+        return found
+    
+    def _download_post(self, session: Session, profile: Profile, post,
+                       profile_dir: Path) -> Optional[Tuple[Post, List[Path]]]:
+        """Download one post unless it was already processed; returns its
+        unsaved row and files, for ``_save_media``"""
+        # Check if already processed
+        existing = session.exec(
+            select(Post.id).where(Post.instagram_id == post.shortcode)
+        ).first()
+        if existing:
+            return None
+        
+        # Download post
+        post_dir = profile_dir / "posts" / post.shortcode
+        post_dir.mkdir(parents=True, exist_ok=True)
+        
+        try:
+            self.loader.download_post(post, target=str(post_dir))
+            
+            # Find downloaded media files
+            media_files = [
+                f for f in list(post_dir.glob("*.jpg")) + list(post_dir.glob("*.mp4")) if not is_variant(f)
+            ]
+            
+        except Exception as e:
+            self.log("warning", f"Failed to download post {post.shortcode}", str(e), profile_id=profile.id)
+            return None
+        
+        if not media_files:
+            return None
+        post_row = Post(
+            profile_id=profile.id,
+            media_type="post",
+            caption=post.caption or "",
+            instagram_id=post.shortcode,
+            timestamp=post.date_utc
+        )
+        return post_row, media_files
+    
+    def backfill_profile(self, profile_id: int, on_media: Optional[Callable[[List[Dict]], None]] = None) -> List[Dict]:
+        """Download the next chunk of a profile's post history.
+
+        The feed iterator is frozen into ``BackfillState`` after each chunk and
+        thawed on the next run, so history is walked once, BACKFILL_CHUNK_POSTS
+        posts at a time, without re-reading pages already covered. When a
+        cursor cannot be resumed the walk restarts from the top; posts newer
+        than ``oldest_timestamp`` are then skipped but still count against the
+        chunk, so catching up is spread over runs like the rest.
+        """
+        with Session(engine) as session:
+            profile = session.get(Profile, profile_id)
+            state = session.get(BackfillState, profile_id)
+            if not profile or not profile.is_active or not state or state.status != "pending":
+                return []
+            
+            new_media = []
+            try:
+                ig_profile = instaloader.Profile.from_username(self.loader.context, profile.username)
+                posts = ig_profile.get_posts()
+                
+                # Only posts older than the ones done are new; a resumed cursor
+                # yields no others, a restarted walk skips down to them
+                skip_newer_than = state.oldest_timestamp
+                if state.frozen_iterator:
+                    try:
+                        posts.thaw(FrozenNodeIterator(**json.loads(state.frozen_iterator)))
+                    except InvalidArgumentException as e:
+                        # Expired or from another login: restart from the top
+                        self.log("warning", f"Backfill cursor for @{profile.username} could not be resumed",
+                                 str(e), profile_id=profile_id)
+                
+                profile_dir = self.media_dir / profile.username
+                profile_dir.mkdir(exist_ok=True)
+                
+                processed = 0
+                scanned = 0
+                for post in posts:
+                    scanned += 1
+                    if not skip_newer_than or post.date_utc <= skip_newer_than:
+                        downloaded = self._download_post(session, profile, post, profile_dir)
+                        if not state.oldest_timestamp or post.date_utc < state.oldest_timestamp:
+                            state.oldest_timestamp = post.date_utc
+                        if downloaded:
+                            saved = self._save_media(session, *downloaded, state)
+                            self._emit(on_media, saved, new_media)
+                        processed += 1
+                    if scanned >= BACKFILL_CHUNK_POSTS:
+                        break
+                else:
+                    # Iterator exhausted: the whole history has been covered
+                    state.status = "done"
+                
+                state.frozen_iterator = None if state.status == "done" else json.dumps(posts.freeze()._asdict())
+                state.posts_done += processed
+                state.last_error = None
+                state.updated_at = datetime.utcnow()
+                session.add(state)
+                session.commit()
+                
+                self.log("info", f"Backfill chunk for @{profile.username}: {processed} posts",
+                         f"Total: {state.posts_done}, skipped: {scanned - processed}, status: {state.status}",
+                         profile_id=profile_id)
+                
+            except Exception as e:
+                session.rollback()
+                state = session.get(BackfillState, profile_id)
+                state.last_error = str(e)
+                state.updated_at = datetime.utcnow()
+                session.add(state)
+                session.commit()
+                self.log("error", f"Backfill failed for @{profile.username}", str(e), profile_id=profile_id)
+            
+            return new_media
+    
+    def _get_story_reel(self, session: Session, userid: int) -> Optional["instaloader.Story"]:
+        """Story reel of a user, or None if the user has no live stories.
+
+        Reels of every active profile with stories enabled are requested
+        together (instaloader sends up to 50 users per query) and cached for
+        STORY_REELS_TTL seconds, so a round of scrapes costs one reels query
+        instead of one per profile.
+        """
+        with self._story_reels_lock:
+            fresh = time.monotonic() - self._story_reels_at < STORY_REELS_TTL
+            if not fresh or userid not in self._story_reels_userids:
+                userids = set(session.exec(
+                    select(Profile.instagram_userid).where(
+                        Profile.is_active == True,
+                        Profile.download_stories == True,
+                        Profile.instagram_userid != None
+                    )
+                ).all())
+                userids.add(userid)
+                reels = {story.owner_id: story for story in self.loader.get_stories(userids=sorted(userids))}
+                self._story_reels = reels
+                self._story_reels_userids = userids
+                self._story_reels_at = time.monotonic()
+            return self._story_reels.get(userid)
+    
+    def _scrape_stories(self, session: Session, profile: Profile, ig_profile, profile_dir: Path, new_media: List[Dict],
+                        on_media: Optional[Callable[[List[Dict]], None]] = None) -> int:
+        """Download story items newer than the profile's cursor; returns the files found.
+
+        The reel's latest_reel_media timestamp comes with the batched reels
+        query; item lists (and the extra iPhone API request instaloader makes
+        for them) are only fetched when it is newer than last_story_timestamp.
+        """
+        found = 0
+        # instaloader's date_utc is naive UTC
+        last_timestamp = profile.last_story_timestamp or datetime.min
         
         try:
-            for post in ig_profile.get_posts():
-                if post.date_utc <= last_timestamp:
-                    break
+            story = self._get_story_reel(session, ig_profile.userid)
+            if story is None or story.latest_media_utc <= last_timestamp:
+                return found
+            
+            for item in story.get_items():
+                if item.date_utc <= last_timestamp:
+                    continue
                 
                 # Check if already processed
                 existing = session.exec(
-                    select(MediaLog).where(MediaLog.instagram_id == post.shortcode)
+                    select(Post.id).where(Post.instagram_id == str(item.mediaid))
                 ).first()
                 if existing:
                     continue
                 
-                # Download post
-                post_dir = profile_dir / "posts" / post.shortcode
-                post_dir.mkdir(parents=True, exist_ok=True)
+                # Download story
+                story_dir = profile_dir / "stories"
+                story_dir.mkdir(exist_ok=True)
                 
                 try:
-                    self.loader.download_post(post, target=str(post_dir))
+                    self.loader.download_storyitem(item, target=str(story_dir))
                     
-                    # Find downloaded media files
-                    media_files = list(post_dir.glob("*.jpg")) + list(post_dir.glob("*.mp4"))
+                    # Find downloaded file
+                    pattern = f"*{item.mediaid}*"
+                    media_files = [f for f in story_dir.glob(pattern) if not is_variant(f)]
                     
-                    for media_file in media_files:
-                        # Create media log entry
-                        media_log = MediaLog(
-                            profile_id=profile.id,
-                            media_type="post",
-                            caption=post.caption or "",
-                            media_path=str(media_file),
-                            instagram_id=post.shortcode,
-                            timestamp=post.date_utc
-                        )
-                        session.add(media_log)
-                        
-                        new_media.append({
-                            "id": media_log.id,
-                            "type": "post",
-                            "caption": post.caption or "",
-                            "timestamp": post.date_utc.isoformat(),
-                            "media_path": str(media_file),
-                            "media_type": "video" if media_file.suffix == ".mp4" else "image",
-                            "instagram_id": post.shortcode
-                        })
-                    
-                    if post.date_utc > latest_timestamp:
-                        latest_timestamp = post.date_utc
                         
                 except Exception as e:
-                    self.log(session, "warning", f"Failed to download post {post.shortcode}", str(e), profile_id=profile.id)
-            
-            # Update last post timestamp
-            if latest_timestamp > last_timestamp:
-                profile.last_post_timestamp = latest_timestamp
-                session.add(profile)
-                session.commit()
+                    self.log("warning", f"Failed to download story {item.mediaid}", str(e), profile_id=profile.id)
+                    continue
+                if not media_files:
+                    continue
                 
-        except Exception as e:
-            self.log(session, "error", "Error scraping posts", str(e), profile_id=profile.id)
-        
-        return new_media
-    
-    def _scrape_stories(self, session: Session, profile: Profile, ig_profile, profile_dir: Path) -> List[Dict]:
-        new_media = []
-        last_timestamp = profile.last_story_timestamp or datetime.min.replace(tzinfo=timezone.utc)
-        latest_timestamp = last_timestamp
-        
-        try:
-            # Get stories for user
-            for story in self.loader.get_stories(userids=[ig_profile.userid]):
-                for item in story.get_items():
-                    if item.date_utc <= last_timestamp:
-                        continue
-                    
-                    # Check if already processed
-                    existing = session.exec(
-                        select(MediaLog).where(MediaLog.instagram_id == str(item.mediaid))
-                    ).first()
-                    if existing:
-                        continue
-                    
-                    # Download story
-                    story_dir = profile_dir / "stories"
-                    story_dir.mkdir(exist_ok=True)
-                    
-                    try:
-                        self.loader.download_storyitem(item, target=str(story_dir))
-                        
-                        # Find downloaded file
-                        pattern = f"*{item.mediaid}*"
-                        media_files = list(story_dir.glob(pattern))
-                        
-                        for media_file in media_files:
-                            # Create media log entry
-                            media_log = MediaLog(
-                                profile_id=profile.id,
-                                media_type="story",
-                                caption="",  # Stories usually don't have captions
-                                media_path=str(media_file),
-                                instagram_id=str(item.mediaid),
-                                timestamp=item.date_utc
-                            )
-                            session.add(media_log)
-                            
-                            new_media.append({
-                                "id": media_log.id,
-                                "type": "story",
-                                "caption": "",
-                                "timestamp": item.date_utc.isoformat(),
-                                "media_path": str(media_file),
-                                "media_type": "video" if item.is_video else "image",
-                                "instagram_id": str(item.mediaid)
-                            })
-                        
-                        if item.date_utc > latest_timestamp:
-                            latest_timestamp = item.date_utc
-                            
-                    except Exception as e:
-                        self.log(session, "warning", f"Failed to download story {item.mediaid}", str(e), profile_id=profile.id)
-            
-            # Update last story timestamp
-            if latest_timestamp > last_timestamp:
-                profile.last_story_timestamp = latest_timestamp
-                session.add(profile)
-                session.commit()
+                post_row = Post(
+                    profile_id=profile.id,
+                    media_type="story",
+                    caption="",  # Stories usually don't have captions
+                    instagram_id=str(item.mediaid),
+                    timestamp=item.date_utc
+                )
+                # Advance the cursor in the same transaction as the item's media
+                if not profile.last_story_timestamp or item.date_utc > profile.last_story_timestamp:
+                    profile.last_story_timestamp = item.date_utc
+                saved = self._save_media(session, post_row, media_files, profile)
+                found += self._emit(on_media, saved, new_media)
                 
         except Exception as e:
-            self.log(session, "error", "Error scraping stories", str(e), profile_id=profile.id)
+            self.log("error", "Error scraping stories", str(e), profile_id=profile.id)
         
-        return new_media
+        return found
     
     def cleanup_old_media(self, hours: int = 24):
         """Remove media files older than specified hours"""
         cutoff_time = datetime.utcnow().timestamp() - (hours * 3600)
         
         with Session(engine) as session:
-            # Get old media logs
+            # Get old delivered files
             old_media = session.exec(
-                select(MediaLog).where(
-                    MediaLog.webhook_sent == True,
-                    MediaLog.sent_at < datetime.fromtimestamp(cutoff_time)
+                select(MediaItem).where(
+                    MediaItem.webhook_sent == True,
+                    MediaItem.sent_at < datetime.fromtimestamp(cutoff_time)
                 )
             ).all()
             
             for media in old_media:
                 try:
                     # Remove file if exists
-                    if os.path.exists(media.media_path):
-                        os.remove(media.media_path)
+                    for path in [media.media_path, *json.loads(media.variants or "{}").values()]:
+                        if os.path.exists(path):
+                            os.remove(path)
                     
                     # Remove empty directories
                     parent_dir = Path(media.media_path).parent
@@ -379,4 +659,4 @@ class InstagramScraper:
                         parent_dir.rmdir()
                         
                 except Exception as e:
-                    self.log(session, "warning", f"Failed to cleanup {media.media_path}", str(e))
\ No newline at end of file
+                    self.log("warning", f"Failed to cleanup {media.media_path}", str(e))
\ No newline at end of file
@@ -0,0 +1,65 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+import re
+
+from sqlalchemy import Boolean, DateTime, text
+
+from .database import Session
+
+# FTS5 has its own query syntax; user input is reduced to quoted terms
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """All terms must match; the last one also matches as a prefix (search-as-you-type)"""
+    terms = _TERM.findall(query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def search_media(session: Session, query: str, profile_id: Optional[int] = None,
+                 media_type: Optional[str] = None, since: Optional[datetime] = None,
+                 until: Optional[datetime] = None, limit: int = 20, offset: int = 0) -> Dict:
+    """Rank captured posts and stories by caption/username relevance (bm25).
+
+    One row more than ``limit`` is read to report ``has_more`` instead of
+    counting every match, which is expensive for common terms.
+    """
+    match = build_match_query(query)
+    if match is None:
+        return {"results": [], "limit": limit, "offset": offset, "has_more": False}
+    
+    where = ["media_fts MATCH :match"]
+    params = {"match": match, "limit": limit + 1, "offset": offset}
+    if profile_id is not None:
+        where.append("m.profile_id = :profile_id")
+        params["profile_id"] = profile_id
+    if media_type:
+        where.append("m.media_type = :media_type")
+        params["media_type"] = media_type
+    if since:
+        where.append("m.timestamp >= :since")
+        params["since"] = since
+    if until:
+        where.append("m.timestamp < :until")
+        params["until"] = until
+    
+    rows = session.connection().execute(text(f"""
+        SELECT m.id, m.profile_id, p.username, m.media_type, m.timestamp, m.instagram_id,
+               NOT EXISTS (SELECT 1 FROM mediaitem i WHERE i.post_id = m.id AND NOT i.webhook_sent)
+                   AS webhook_sent,
+               snippet(media_fts, 0, '[', ']', '…', 16) AS snippet,
+               bm25(media_fts) AS score
+        FROM media_fts
+        JOIN post m ON m.id = media_fts.rowid
+        LEFT JOIN profile p ON p.id = m.profile_id
+        WHERE {" AND ".join(where)}
+        ORDER BY rank
+        LIMIT :limit OFFSET :offset
+    """).columns(timestamp=DateTime, webhook_sent=Boolean), params).mappings().all()
+    
+    results: List[Dict] = [dict(row) for row in rows[:limit]]
+    return {"results": results, "limit": limit, "offset": offset, "has_more": len(rows) > limit}
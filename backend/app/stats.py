@@ -0,0 +1,205 @@
+from datetime import datetime
+from typing import Dict, Optional
+import threading
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import select
+
+from .broadcast import hub
+from .database import Session, engine
+from .models import LogRollup, Post, Profile, SystemLog
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+class StatsTracker:
+    """In-memory dashboard counters and per-profile status.
+
+    Loaded once from the database, then kept current from ORM events and
+    explicit scraper/delivery calls. Every change is pushed through the hub
+    as a ``stats`` event (changed fields only) or a ``profile_status`` event,
+    so open dashboards never need to poll.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            "total_posts": 0,
+            "total_stories": 0,
+            "total_errors": 0,
+            "last_check": None,
+        }
+        self.profiles: Dict[int, Dict] = {}
+
+    def load(self):
+        """Initialize counters with aggregate queries"""
+        with Session(engine) as session:
+            media_counts = dict(session.exec(
+                select(Post.media_type, func.count(Post.id)).group_by(Post.media_type)
+            ).all())
+            total_errors = session.exec(
+                select(func.count(SystemLog.id)).where(SystemLog.level == "error")
+            ).one()
+            # Errors already pruned by log retention
+            total_errors += session.exec(
+                select(func.coalesce(func.sum(LogRollup.count), 0)).where(LogRollup.level == "error")
+            ).one()
+            last_check = session.exec(select(func.max(SystemLog.created_at))).one()
+            profiles = session.exec(select(Profile)).all()
+
+        with self._lock:
+            self.counters = {
+                "total_posts": media_counts.get("post", 0),
+                "total_stories": media_counts.get("story", 0),
+                "total_errors": total_errors,
+                "last_check": _iso(last_check),
+            }
+            self.profiles = {}
+            for profile in profiles:
+                latest = [t for t in (profile.last_post_timestamp, profile.last_story_timestamp) if t]
+                self.profiles[profile.id] = {
+                    "profile_id": profile.id,
+                    "username": profile.username,
+                    "is_active": profile.is_active,
+                    "last_check": _iso(profile.updated_at),
+                    "last_item": _iso(max(latest)) if latest else None,
+                    "last_error": None,
+                    "webhooks_sent": 0,
+                    "webhooks_failed": 0,
+                }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "total_profiles": len(self.profiles),
+                "active_profiles": sum(1 for p in self.profiles.values() if p["is_active"]),
+                **self.counters,
+            }
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            profiles = {str(pid): dict(status) for pid, status in self.profiles.items()}
+        return {"stats": self.stats(), "profiles": profiles}
+
+    # Counter updates
+
+    def _push_stats(self, *fields):
+        stats = self.stats()
+        hub.publish({"type": "stats", "data": {field: stats[field] for field in fields}})
+
+    def _push_profile(self, profile_id: int):
+        with self._lock:
+            status = self.profiles.get(profile_id)
+            status = dict(status) if status else {"profile_id": profile_id, "deleted": True}
+        hub.publish({"type": "profile_status", "data": status})
+
+    def _update_profile(self, profile_id: int, **changes):
+        with self._lock:
+            status = self.profiles.get(profile_id)
+            if status is None:
+                return
+            status.update(changes)
+        self._push_profile(profile_id)
+
+    def media_added(self, media_type: str, profile_id: int, timestamp: Optional[datetime]):
+        field = "total_posts" if media_type == "post" else "total_stories"
+        with self._lock:
+            self.counters[field] += 1
+            status = self.profiles.get(profile_id)
+            if status is not None and timestamp:
+                if not status["last_item"] or timestamp.isoformat() > status["last_item"]:
+                    status["last_item"] = timestamp.isoformat()
+        self._push_stats(field)
+        self._push_profile(profile_id)
+
+    def log_added(self, level: str, created_at: Optional[datetime]):
+        with self._lock:
+            self.counters["last_check"] = _iso(created_at or datetime.utcnow())
+            if level == "error":
+                self.counters["total_errors"] += 1
+        if level == "error":
+            self._push_stats("total_errors", "last_check")
+        else:
+            self._push_stats("last_check")
+
+    def profile_saved(self, profile_id: int, username: str, is_active: bool):
+        with self._lock:
+            status = self.profiles.setdefault(profile_id, {
+                "profile_id": profile_id,
+                "last_check": None,
+                "last_item": None,
+                "last_error": None,
+                "webhooks_sent": 0,
+                "webhooks_failed": 0,
+            })
+            status["username"] = username
+            status["is_active"] = is_active
+        self._push_stats("total_profiles", "active_profiles")
+        self._push_profile(profile_id)
+
+    def profile_deleted(self, profile_id: int):
+        with self._lock:
+            self.profiles.pop(profile_id, None)
+        self._push_stats("total_profiles", "active_profiles")
+        self._push_profile(profile_id)
+
+    # Called by the scraper and delivery paths
+
+    def profile_checked(self, profile_id: int, error: Optional[str] = None):
+        """Record the outcome of a scrape run"""
+        self._update_profile(profile_id, last_check=datetime.utcnow().isoformat(), last_error=error)
+
+    def profile_delivered(self, profile_id: int, sent: int, failed: int):
+        """Record webhook deliveries for a scrape run"""
+        with self._lock:
+            status = self.profiles.get(profile_id)
+            if status is None:
+                return
+            status["webhooks_sent"] += sent
+            status["webhooks_failed"] += failed
+        self._push_profile(profile_id)
+
+
+stats_tracker = StatsTracker()
+
+
+# ORM changes are applied to the counters once their transaction commits
+def _defer(target, callback, *args):
+    session = OrmSession.object_session(target)
+    if session is not None:
+        session.info.setdefault("pending_stats", []).append((callback, args))
+
+
+@event.listens_for(Post, "after_insert")
+def _on_media_insert(mapper, connection, target):
+    _defer(target, stats_tracker.media_added, target.media_type, target.profile_id, target.timestamp)
+
+
+@event.listens_for(SystemLog, "after_insert")
+def _on_log_insert(mapper, connection, target):
+    _defer(target, stats_tracker.log_added, target.level, target.created_at)
+
+
+@event.listens_for(Profile, "after_insert")
+@event.listens_for(Profile, "after_update")
+def _on_profile_save(mapper, connection, target):
+    _defer(target, stats_tracker.profile_saved, target.id, target.username, target.is_active)
+
+
+@event.listens_for(Profile, "after_delete")
+def _on_profile_delete(mapper, connection, target):
+    _defer(target, stats_tracker.profile_deleted, target.id)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _apply_pending(session):
+    for callback, args in session.info.pop("pending_stats", []):
+        callback(*args)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_pending(session):
+    session.info.pop("pending_stats", None)
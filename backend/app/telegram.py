@@ -0,0 +1,218 @@
+import requests
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from itertools import groupby
+from typing import Deque, Dict, List, Optional, Tuple
+from .models import SystemLog
+from .database import Session, engine
+import json
+import os
+import threading
+import time
+
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+# Point this at a local stub of the Bot API to test without Telegram
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
+# Bot API limits: ~30 messages/s overall, 1 message/s per chat and
+# 20 messages/min in groups (negative chat ids)
+TELEGRAM_GLOBAL_PER_SECOND = 30
+TELEGRAM_CHAT_INTERVAL = 1.0
+TELEGRAM_GROUP_INTERVAL = 3.0
+TELEGRAM_MAX_ATTEMPTS = 5
+TELEGRAM_CAPTION_LIMIT = 1024
+TELEGRAM_MEDIA_GROUP_LIMIT = 10
+FILE_IDS_KEPT = 1000
+
+
+class TelegramError(Exception):
+    pass
+
+
+class TelegramRetryAfter(TelegramError):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class TelegramSender:
+    """Sends media to Telegram chats through the Bot API.
+
+    Requests go through a queue served by one worker thread, which spaces
+    messages per chat and overall according to the Bot API limits and waits
+    out ``retry_after`` on 429 responses instead of failing. Files are
+    uploaded once; later sends of the same file (e.g. to another chat) reuse
+    the ``file_id`` Telegram returned.
+    """
+    
+    def __init__(self, token: str, api_url: str = TELEGRAM_API_URL, timeout: int = 60):
+        self.api_url = f"{api_url.rstrip('/')}/bot{token}"
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.file_ids: "OrderedDict[str, str]" = OrderedDict()  # media_path -> file_id
+        self._queues: Dict[str, Deque[Tuple[List[Dict], str, Future, int]]] = {}
+        self._next_send: Dict[str, float] = {}  # chat_id -> monotonic time
+        self._recent_sends: Deque[float] = deque()
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+    
+    # Queue
+    
+    def submit(self, chat_id: str, media: List[Dict], caption: str = "") -> Future:
+        """Queue a message (one item, or a media group of up to 10); the Future
+        resolves to the sent Telegram messages"""
+        future: Future = Future()
+        with self._cond:
+            self._queues.setdefault(chat_id, deque()).append((media, caption, future, 1))
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="telegram-sender", daemon=True)
+                self._worker.start()
+            self._cond.notify()
+        return future
+    
+    def _chat_interval(self, chat_id: str) -> float:
+        return TELEGRAM_GROUP_INTERVAL if chat_id.startswith("-") else TELEGRAM_CHAT_INTERVAL
+    
+    def _next_job(self):
+        """Wait for the chat that may send soonest, within the global rate"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._recent_sends and now - self._recent_sends[0] >= 1.0:
+                    self._recent_sends.popleft()
+                ready = [chat_id for chat_id, queue in self._queues.items() if queue]
+                if not ready:
+                    self._cond.wait()
+                    continue
+                chat_id = min(ready, key=lambda c: self._next_send.get(c, 0.0))
+                wait = self._next_send.get(chat_id, 0.0) - now
+                if len(self._recent_sends) >= TELEGRAM_GLOBAL_PER_SECOND:
+                    wait = max(wait, 1.0 - (now - self._recent_sends[0]))
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                self._recent_sends.append(now)
+                self._next_send[chat_id] = now + self._chat_interval(chat_id)
+                return chat_id, self._queues[chat_id].popleft()
+    
+    def _run(self):
+        while True:
+            chat_id, (media, caption, future, attempt) = self._next_job()
+            try:
+                future.set_result(self._send(chat_id, media, caption))
+            except TelegramRetryAfter as e:
+                if attempt >= TELEGRAM_MAX_ATTEMPTS:
+                    future.set_exception(TelegramError(f"Rate limited after {attempt} attempts"))
+                    continue
+                # Back to the front of its chat's queue, after the wait Telegram asked for
+                with self._cond:
+                    self._next_send[chat_id] = time.monotonic() + e.retry_after
+                    self._queues[chat_id].appendleft((media, caption, future, attempt + 1))
+            except Exception as e:
+                future.set_exception(e)
+    
+    # Bot API calls
+    
+    def _call(self, method: str, data: Dict, files: Optional[Dict] = None) -> Dict:
+        response = self.session.post(f"{self.api_url}/{method}", data=data, files=files, timeout=self.timeout)
+        try:
+            body = response.json()
+        except ValueError:
+            raise TelegramError(f"{method}: HTTP {response.status_code}")
+        if body.get("ok"):
+            return body["result"]
+        retry_after = (body.get("parameters") or {}).get("retry_after")
+        if response.status_code == 429 and retry_after is not None:
+            raise TelegramRetryAfter(retry_after)
+        raise TelegramError(f"{method}: {body.get('description', response.status_code)}")
+    
+    def _send(self, chat_id: str, media: List[Dict], caption: str):
+        caption = caption[:TELEGRAM_CAPTION_LIMIT]
+        files = {}
+        try:
+            entries = []
+            for index, item in enumerate(media):
+                file_id = self.file_ids.get(item["media_path"])
+                if file_id:
+                    ref = file_id
+                else:
+                    name = f"file{index}"
+                    files[name] = open(item["media_path"], "rb")
+                    ref = f"attach://{name}"
+                entries.append({"type": "video" if item["media_type"] == "video" else "photo", "media": ref})
+            
+            if len(entries) == 1:
+                entry = entries[0]
+                method = "sendVideo" if entry["type"] == "video" else "sendPhoto"
+                data = {"chat_id": chat_id, entry["type"]: entry["media"]}
+                if caption:
+                    data["caption"] = caption
+                if files:
+                    # Single uploads use the field itself, not attach://
+                    files = {entry["type"]: files["file0"]}
+                    del data[entry["type"]]
+                messages = [self._call(method, data, files or None)]
+            else:
+                if caption:
+                    entries[0]["caption"] = caption
+                data = {"chat_id": chat_id, "media": json.dumps(entries)}
+                messages = self._call("sendMediaGroup", data, files or None)
+        finally:
+            for f in files.values():
+                f.close()
+        
+        for item, message in zip(media, messages):
+            self._remember_file_id(item["media_path"], message)
+        return messages
+    
+    def _remember_file_id(self, media_path: str, message: Dict):
+        if "photo" in message:
+            file_id = message["photo"][-1]["file_id"]  # Largest size
+        elif "video" in message:
+            file_id = message["video"]["file_id"]
+        else:
+            return
+        self.file_ids[media_path] = file_id
+        self.file_ids.move_to_end(media_path)
+        while len(self.file_ids) > FILE_IDS_KEPT:
+            self.file_ids.popitem(last=False)
+
+
+def group_media(media_list: list) -> List[List[Dict]]:
+    """Split new media into messages: files of one post (a carousel) share
+    post_id, arrive together and become one media group of up to 10"""
+    groups = []
+    for _, items in groupby(media_list, key=lambda m: m["post_id"]):
+        items = sorted(items, key=lambda m: m["media_path"])
+        for start in range(0, len(items), TELEGRAM_MEDIA_GROUP_LIMIT):
+            groups.append(items[start:start + TELEGRAM_MEDIA_GROUP_LIMIT])
+    return groups
+
+
+class TelegramManager:
+    """Delivers new media to Telegram chats"""
+    
+    def __init__(self, token: str = TELEGRAM_BOT_TOKEN, api_url: str = TELEGRAM_API_URL):
+        self.sender = TelegramSender(token, api_url) if token else None
+    
+    @property
+    def enabled(self) -> bool:
+        return self.sender is not None
+    
+    def send_group(self, chat_id: str, group: List[Dict]) -> bool:
+        """Send one message from ``group_media``, waiting in the sender's queue"""
+        if not self.sender:
+            self._log("error", "Telegram não configurado", "Defina TELEGRAM_BOT_TOKEN")
+            return False
+        try:
+            self.sender.submit(chat_id, group, group[0]["caption"] or "").result()
+        except Exception as e:
+            self._log("error", f"Falha ao enviar {group[0]['type']} ao Telegram",
+                      f"Chat: {chat_id}, Media ID: {group[0]['instagram_id']}, Erro: {e}")
+            return False
+        return True
+    
+    def _log(self, level: str, message: str, details: Optional[str] = None):
+        with Session(engine) as session:
+            session.add(SystemLog(level=level, message=message, details=details))
+            session.commit()
@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+# Smaller renditions made after download, e.g. MEDIA_VARIANTS=preview,thumb.
+# Empty (the default) turns the stage off. Images need Pillow; video poster
+# frames also need an ffmpeg binary on PATH.
+MEDIA_VARIANTS = [v.strip() for v in os.getenv("MEDIA_VARIANTS", "").split(",") if v.strip()]
+VARIANT_WORKERS = int(os.getenv("VARIANT_WORKERS", "2"))
+# name -> (longest side in px, format, quality)
+VARIANT_SPECS = {
+    "preview": (1080, "JPEG", 82),
+    "thumb": (320, "WEBP", 75),
+}
+_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp"}
+
+
+def variant_path(media_path: Path, name: str) -> Path:
+    """Where a variant is stored: next to the original, e.g. 1.jpg -> 1.thumb.webp"""
+    return media_path.with_name(f"{media_path.stem}.{name}{_EXTENSIONS[VARIANT_SPECS[name][1]]}")
+
+
+def is_variant(path: Path) -> bool:
+    """Whether a file is a variant, so globs over a download dir skip it"""
+    return len(path.suffixes) > 1 and path.suffixes[-2][1:] in VARIANT_SPECS
+
+
+class VariantGenerator:
+    """Makes the configured variants of downloaded files on a small pool.
+    
+    Images are resized (never enlarged) and recompressed; videos get the
+    same variants from a poster frame. Missing optional dependencies turn
+    the affected part off instead of failing the scrape.
+    """
+    
+    def __init__(self, names: List[str] = MEDIA_VARIANTS, workers: int = VARIANT_WORKERS):
+        self.names = [name for name in names if name in VARIANT_SPECS]
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._workers = workers
+        self._lock = threading.Lock()
+        self.ffmpeg = shutil.which("ffmpeg")
+        try:
+            from PIL import Image  # noqa: F401
+            self.available = True
+        except ImportError:
+            self.available = False
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.names) and self.available
+    
+    def generate_many(self, media_paths: List[Path]) -> Dict[str, Dict[str, str]]:
+        """Variants per original path (as str), made in parallel; files whose
+        variants failed are left out"""
+        if not self.enabled or not media_paths:
+            return {}
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._workers, thread_name_prefix="variants")
+        results = self._executor.map(self._generate_safe, media_paths)
+        return {str(path): variants for path, variants in zip(media_paths, results) if variants}
+    
+    def _generate_safe(self, media_path: Path) -> Dict[str, str]:
+        try:
+            return self.generate(media_path)
+        except Exception:
+            return {}
+    
+    def generate(self, media_path: Path) -> Dict[str, str]:
+        """Make every configured variant of one file; returns name -> path"""
+        if media_path.suffix.lower() == ".mp4":
+            if not self.ffmpeg:
+                return {}
+            with tempfile.TemporaryDirectory() as tmp:
+                poster = Path(tmp) / "poster.jpg"
+                subprocess.run(
+                    [self.ffmpeg, "-loglevel", "error", "-y", "-i", str(media_path),
+                     "-frames:v", "1", "-q:v", "2", str(poster)],
+                    check=True, timeout=60
+                )
+                return self._resize(poster, media_path)
+        return self._resize(media_path, media_path)
+    
+    def _resize(self, source: Path, original: Path) -> Dict[str, str]:
+        from PIL import Image
+        
+        variants = {}
+        with Image.open(source) as image:
+            image = image.convert("RGB")
+            for name in self.names:
+                size, image_format, quality = VARIANT_SPECS[name]
+                rendition = image.copy()
+                rendition.thumbnail((size, size))
+                target = variant_path(original, name)
+                rendition.save(target, image_format, quality=quality)
+                variants[name] = str(target)
+        return variants
+
+
+variant_generator = VariantGenerator()
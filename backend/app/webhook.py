@@ -1,24 +1,95 @@
 import requests
-from datetime import datetime
-from typing import Dict, Optional
-from sqlmodel import Session
-from .models import MediaLog, SystemLog
-from .database import engine
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional
+from .models import SystemLog
+from .database import Session, engine
+import json
+import mimetypes
 import os
+import uuid
 from pathlib import Path
 
+# "url": the webhook gets a link to /media; "inline": the file is sent in the
+# webhook request itself (multipart/form-data), up to WEBHOOK_INLINE_MAX_BYTES
+WEBHOOK_DELIVERY_MODE = os.getenv("WEBHOOK_DELIVERY_MODE", "url")
+WEBHOOK_INLINE_MAX_BYTES = int(os.getenv("WEBHOOK_INLINE_MAX_BYTES", str(20 * 1024 * 1024)))
+
+
+class MultipartFileStream:
+    """multipart/form-data body with a JSON ``payload`` field and a ``file`` field.
+
+    The file is read from disk in chunks while requests sends the body, and
+    ``__len__`` lets requests send a Content-Length instead of chunked encoding.
+    """
+    
+    chunk_size = 64 * 1024
+    
+    def __init__(self, payload: Dict, file_path: Path):
+        self.file_path = file_path
+        self.boundary = uuid.uuid4().hex
+        content_type = mimetypes.guess_type(file_path.name)[0] or "application/octet-stream"
+        self.head = (
+            f"--{self.boundary}\r\n"
+            'Content-Disposition: form-data; name="payload"\r\n'
+            "Content-Type: application/json\r\n\r\n"
+            f"{json.dumps(payload)}\r\n"
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{file_path.name}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode()
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self.file_size = file_path.stat().st_size
+    
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+    
+    def __len__(self) -> int:
+        return len(self.head) + self.file_size + len(self.tail)
+    
+    def __iter__(self) -> Iterator[bytes]:
+        yield self.head
+        with open(self.file_path, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        yield self.tail
+
 
 class WebhookSender:
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, delivery_mode: str = WEBHOOK_DELIVERY_MODE,
+                 inline_max_bytes: int = WEBHOOK_INLINE_MAX_BYTES):
         self.base_url = base_url.rstrip('/')
+        self.media_dir = Path(__file__).parent.parent / "media"
         self.timeout = 30
+        self.delivery_mode = delivery_mode
+        self.inline_max_bytes = inline_max_bytes
+    
+    def _use_inline(self, media_path: Path) -> bool:
+        """Inline mode, unless the file is too large (e.g. long videos) or missing"""
+        if self.delivery_mode != "inline":
+            return False
+        try:
+            return media_path.stat().st_size <= self.inline_max_bytes
+        except OSError:
+            return False
+    
+    def _media_url(self, path: Path) -> str:
+        """Public URL of a file under the /media mount"""
+        try:
+            relative = path.resolve().relative_to(self.media_dir.resolve()).as_posix()
+        except ValueError:
+            relative = path.name
+        return f"{self.base_url}/media/{relative}"
     
     def send_media(self, webhook_url: str, media_data: Dict, profile_username: str) -> bool:
-        """Send media data to N8N webhook"""
+        """Send media data to N8N webhook; sent status is recorded by the caller"""
         try:
             # Prepare webhook payload
             media_path = Path(media_data["media_path"])
-            media_url = f"{self.base_url}/media/{media_path.name}"
+            inline = self._use_inline(media_path)
             
             payload = {
                 "profile": profile_username,
@@ -26,41 +97,38 @@ class WebhookSender:
                 "caption": media_data["caption"],
                 "timestamp": media_data["timestamp"],
                 "media": {
-                    "url": media_url,
                     "type": media_data["media_type"],
-                    "expires_at": (datetime.utcnow().replace(hour=datetime.utcnow().hour + 1)).isoformat()
+                    "delivery": "inline" if inline else "url",
+                    "variant": media_data.get("variant")  # None for the original file
                 },
                 "metadata": {
-                    "instagram_id": media_data["instagram_id"]
+                    "instagram_id": media_data["instagram_id"],
+                    "post_id": media_data["post_id"]  # Shared by the files of a carousel
                 }
             }
             
-            # Send webhook
-            response = requests.post(
-                webhook_url,
-                json=payload,
-                timeout=self.timeout,
-                headers={"Content-Type": "application/json"}
-            )
+            if media_data.get("poster_path"):
+                payload["media"]["poster_url"] = self._media_url(Path(media_data["poster_path"]))
             
-            # Update media log
-            with Session(engine) as session:
-                if media_data.get("id"):
-                    media_log = session.get(MediaLog, media_data["id"])
-                    if media_log:
-                        media_log.webhook_sent = True
-                        media_log.sent_at = datetime.utcnow()
-                        session.add(media_log)
-                        session.commit()
-                
-                # Log success
-                log_entry = SystemLog(
-                    level="info",
-                    message=f"Webhook sent successfully for {media_data['type']}",
-                    details=f"Status: {response.status_code}"
+            # Send webhook
+            if inline:
+                payload["media"]["filename"] = media_path.name
+                body = MultipartFileStream(payload, media_path)
+                response = requests.post(
+                    webhook_url,
+                    data=body,
+                    timeout=self.timeout,
+                    headers={"Content-Type": body.content_type}
+                )
+            else:
+                payload["media"]["url"] = self._media_url(media_path)
+                payload["media"]["expires_at"] = (datetime.utcnow() + timedelta(hours=1)).isoformat()
+                response = requests.post(
+                    webhook_url,
+                    json=payload,
+                    timeout=self.timeout,
+                    headers={"Content-Type": "application/json"}
                 )
-                session.add(log_entry)
-                session.commit()
             
             return response.status_code in [200, 201, 202, 204]
             
@@ -84,27 +152,3 @@ class WebhookSender:
             session.add(log_entry)
             session.commit()
 
-
-class WebhookManager:
-    def __init__(self, base_url: str):
-        self.sender = WebhookSender(base_url)
-    
-    def process_new_media(self, media_list: list, webhook_url: str, profile_username: str):
-        """Process and send all new media to webhook"""
-        success_count = 0
-        
-        for media in media_list:
-            if self.sender.send_media(webhook_url, media, profile_username):
-                success_count += 1
-            else:
-                # Log failure but continue with other media
-                with Session(engine) as session:
-                    log_entry = SystemLog(
-                        level="warning",
-                        message=f"Failed to send {media['type']} to webhook",
-                        details=f"Media ID: {media.get('instagram_id', 'unknown')}"
-                    )
-                    session.add(log_entry)
-                    session.commit()
-        
-        return success_count
\ No newline at end of file
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import time
+
+import pytest
+
+# The app modules create their engines on import: point them at a scratch
+# database before anything imports them
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="tests-"), "test.db")
+
+
+class StubScraper:
+    """Stands in for InstagramScraper: blocks like a real login, never touches the network"""
+    
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.logins = 0
+    
+    @property
+    def loader(self):
+        raise RuntimeError("No Instagram access in tests")
+    
+    def login_with_account(self, account_id: int, password: str) -> bool:
+        time.sleep(self.delay)
+        self.logins += 1
+        return True
+
+
+@pytest.fixture(scope="session")
+def stub_scraper():
+    return StubScraper(delay=1.5)
+
+
+@pytest.fixture(scope="session")
+def client(stub_scraper):
+    """One app instance for the whole run: shutdown stops the scheduler and job pools"""
+    from fastapi.testclient import TestClient
+    from app import main, scheduler
+    
+    def get_scraper():
+        # Building the real scraper loads a session and logs in over the network
+        time.sleep(stub_scraper.delay)
+        return stub_scraper
+    
+    patch = pytest.MonkeyPatch()
+    patch.setattr(scheduler, "get_scraper", get_scraper)
+    patch.setattr(main, "get_scraper", get_scraper)
+    with TestClient(main.app) as client:
+        # Startup finishes in the background
+        deadline = time.monotonic() + 30
+        while main.startup_state["status"] == "pending" and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert main.startup_state["status"] == "ready", main.startup_state
+        yield client
+    patch.undo()
+
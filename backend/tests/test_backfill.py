@@ -0,0 +1,83 @@
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import instaloader
+from instaloader.exceptions import InvalidArgumentException
+from instaloader.nodeiterator import FrozenNodeIterator
+
+from app import scraper as scraper_module
+from app.database import Session, create_db_and_tables, engine
+from app.models import BackfillState, Profile
+from app.scraper import InstagramScraper
+
+NEWEST = datetime(2024, 6, 1)
+
+
+class FakePosts:
+    """Newest-first feed that can be frozen and thawed like instaloader's NodeIterator"""
+    
+    def __init__(self, count: int):
+        self.posts = [SimpleNamespace(shortcode=f"p{i}", date_utc=NEWEST - timedelta(hours=i)) for i in range(count)]
+        self.index = 0
+    
+    def __iter__(self):
+        while self.index < len(self.posts):
+            self.index += 1
+            yield self.posts[self.index - 1]
+    
+    def freeze(self) -> FrozenNodeIterator:
+        fields = dict.fromkeys(FrozenNodeIterator._fields)
+        return FrozenNodeIterator(**dict(fields, query_hash="fake", total_index=self.index))
+    
+    def thaw(self, frozen: FrozenNodeIterator):
+        if frozen.query_hash == "expired":
+            raise InvalidArgumentException("Mismatching resume information.")
+        self.index = frozen.total_index
+
+
+def _scraper(tmp_path, monkeypatch, feed: FakePosts):
+    monkeypatch.setattr(instaloader.Profile, "from_username",
+                        lambda context, username: SimpleNamespace(get_posts=lambda: feed))
+    scraper = InstagramScraper.__new__(InstagramScraper)
+    scraper.loader = SimpleNamespace(context=None)
+    scraper.media_dir = tmp_path
+    scraper.log = lambda *args, **kwargs: None
+    scraper.downloaded = []
+    scraper._download_post = lambda session, profile, post, profile_dir: scraper.downloaded.append(post.shortcode)
+    return scraper
+
+
+def test_restarted_backfill_counts_skipped_posts_against_the_chunk(tmp_path, monkeypatch):
+    create_db_and_tables()
+    monkeypatch.setattr(scraper_module, "BACKFILL_CHUNK_POSTS", 24)
+    feed = FakePosts(100)
+    with Session(engine) as session:
+        profile = Profile(username="backfill_profile", webhook_url="")
+        session.add(profile)
+        session.commit()
+        expired = dict.fromkeys(FrozenNodeIterator._fields)
+        session.add(BackfillState(
+            profile_id=profile.id,
+            frozen_iterator=json.dumps(dict(expired, query_hash="expired")),
+            oldest_timestamp=feed.posts[60].date_utc,
+            posts_done=60
+        ))
+        session.commit()
+        profile_id = profile.id
+    scraper = _scraper(tmp_path, monkeypatch, feed)
+    
+    # Cursor expired: the walk restarts and only reads one chunk of posts already done
+    scraper.backfill_profile(profile_id)
+    assert feed.index == 24
+    assert scraper.downloaded == []
+    
+    # The restarted walk is frozen and resumed like any other
+    scraper.backfill_profile(profile_id)
+    scraper.backfill_profile(profile_id)
+    assert feed.index == 72
+    assert scraper.downloaded == [f"p{i}" for i in range(60, 72)]
+    with Session(engine) as session:
+        state = session.get(BackfillState, profile_id)
+        assert state.status == "pending"
+        assert state.oldest_timestamp == feed.posts[71].date_utc
@@ -0,0 +1,19 @@
+from app.broadcast import Subscriber
+
+
+def _log(log_id: int) -> dict:
+    return {"type": "log", "data": {"id": log_id, "level": "INFO"}}
+
+
+def test_drain_skips_only_replayed_logs():
+    subscriber = Subscriber(websocket=None)
+    subscriber.replayed = {5, 6}
+    subscriber.last_id = 6
+    
+    # 4 committed before the replay query but was published late
+    for log_id in (6, 4, 7, 5):
+        subscriber.offer(_log(log_id))
+    
+    assert [item["data"]["id"] for item in subscriber.drain(10)] == [4, 7]
+    assert subscriber.last_id == 7
+    assert not subscriber.replayed
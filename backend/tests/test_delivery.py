@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+from app import delivery
+from app.delivery import DeliveryManager
+
+
+def test_critical_delivery_does_not_wait_behind_standard_retries(monkeypatch):
+    monkeypatch.setattr(delivery, "DELIVERY_LANE_WORKERS", 2)
+    monkeypatch.setattr(delivery.stats_tracker, "profile_delivered", lambda *args: None)
+    manager = DeliveryManager("http://localhost")
+    monkeypatch.setattr(manager, "_load_destinations", lambda profile_id: ("user", [{"id": profile_id}]))
+    
+    def deliver_to(destination, new_media, username):
+        if destination["id"] != 1:
+            time.sleep(1)  # A standard destination sleeping in retry backoff
+        return len(new_media), 0
+    
+    monkeypatch.setattr(manager, "_deliver_to", deliver_to)
+    
+    async def scenario():
+        standard = [asyncio.create_task(manager.deliver(profile_id, [{}], "standard")) for profile_id in range(2, 8)]
+        await asyncio.sleep(0.1)
+        started = time.monotonic()
+        await manager.deliver(1, [{}], "critical")
+        elapsed = time.monotonic() - started
+        await asyncio.gather(*standard)
+        return elapsed
+    
+    try:
+        assert asyncio.run(scenario()) < 0.5
+    finally:
+        manager.shutdown()
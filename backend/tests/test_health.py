@@ -0,0 +1,47 @@
+import time
+
+
+
+def _create_account(client, username: str, password: str) -> int:
+    response = client.post("/api/instagram-accounts", json={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def _create_profile(client, username: str) -> int:
+    response = client.post("/api/profiles", json={"username": username, "webhook_url": "http://localhost/hook"})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def _job_status(client, job_id: str) -> str:
+    return client.get(f"/api/jobs/{job_id}").json()["status"]
+
+
+def test_health_stays_fast_while_scraper_jobs_block(client, stub_scraper):
+    account_id = _create_account(client, "health_account", "secret")
+    profile_id = _create_profile(client, "health_profile")
+    
+    test_job = client.post(f"/api/test/{profile_id}")
+    login_job = client.post(f"/api/instagram-accounts/{account_id}/test-login", params={"password": "secret"})
+    assert test_job.status_code == 202 and login_job.status_code == 202
+    job_ids = [test_job.json()["job_id"], login_job.json()["job_id"]]
+    
+    # Both jobs now block a worker thread in the stubbed get_scraper()/login
+    latencies = []
+    for _ in range(10):
+        started = time.perf_counter()
+        response = client.get("/health")
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200
+        time.sleep(0.05)
+    assert all(_job_status(client, job_id) in ("queued", "running") for job_id in job_ids)
+    assert max(latencies) < 0.25, latencies
+    
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline and not all(
+        _job_status(client, job_id) in ("completed", "failed") for job_id in job_ids
+    ):
+        time.sleep(0.1)
+    assert _job_status(client, job_ids[1]) == "completed"
+    assert stub_scraper.logins >= 1
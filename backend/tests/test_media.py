@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from app.database import Session, engine
+from app.models import MediaItem, Post
+
+
+def test_media_pages_cover_every_file_once_newest_first(client):
+    profile_id = client.post(
+        "/api/profiles", json={"username": "media_profile", "webhook_url": "http://localhost/hook"}
+    ).json()["id"]
+    with Session(engine) as session:
+        # Posts 0/1 and 2/3 share a timestamp, so the post id breaks the tie
+        for index in range(6):
+            post = Post(profile_id=profile_id, media_type="post", instagram_id=f"media_{index}",
+                        timestamp=datetime(2024, 5, 1 + index // 2))
+            session.add(post)
+            session.flush()
+            for _ in range(3):
+                session.add(MediaItem(post_id=post.id, media_path=f"/tmp/{post.id}.jpg", file_type="image"))
+        session.commit()
+    
+    seen, cursor = [], None
+    while True:
+        params = {"profile_id": profile_id, "limit": 4, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/media", params=params).json()
+        seen += [(item["timestamp"], item["post_id"], item["id"]) for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    
+    assert len(seen) == 18
+    assert seen == sorted(seen, reverse=True)
@@ -0,0 +1,113 @@
+import pytest
+from sqlmodel import SQLModel, create_engine
+
+from app import planner
+from app.database import Session
+from app.models import InstagramAccount, Post, Profile
+from app.planner import PLANNER_MAX_INTERVAL_MINUTES, plan_intervals, plan_profiles
+
+
+def _profile(profile_id: int, interval: int, cost: float = 3.0, priority: int = 1, activity: int = 0):
+    return {"id": profile_id, "interval": interval, "cost": cost, "priority": priority, "activity": activity}
+
+
+def _rate(profile, interval: int) -> float:
+    return profile["cost"] * 60 / interval
+
+
+def test_profiles_within_budget_keep_their_interval():
+    profiles = [_profile(1, 5), _profile(2, 30), _profile(3, 60)]
+    assert plan_intervals(profiles, budget_per_hour=1000) == {1: 5, 2: 30, 3: 60}
+
+
+def test_over_budget_intervals_grow_to_fit():
+    profiles = [_profile(i, 1) for i in range(1, 5)]
+    intervals = plan_intervals(profiles, budget_per_hour=100)
+    assert all(intervals[p["id"]] > p["interval"] for p in profiles)
+    assert sum(_rate(p, intervals[p["id"]]) for p in profiles) <= 100
+
+
+def test_cheap_profiles_get_their_request_and_the_rest_is_shared_again():
+    # Profile 1 needs 1 query/h, far below an even third of 60; the other two
+    # split the remaining 59 instead of 20 each
+    profiles = [_profile(1, 60, cost=1), _profile(2, 1), _profile(3, 1)]
+    assert plan_intervals(profiles, budget_per_hour=60) == {1: 60, 2: 7, 3: 7}
+
+
+def test_budget_is_shared_by_priority():
+    profiles = [_profile(1, 1, priority=2), _profile(2, 1, priority=1)]
+    # 40 and 20 queries/h for 180 wanted each
+    assert plan_intervals(profiles, budget_per_hour=60) == {1: 5, 2: 9}
+
+
+def test_recent_activity_raises_the_share():
+    profiles = [_profile(1, 1, activity=20), _profile(2, 1)]
+    intervals = plan_intervals(profiles, budget_per_hour=60)
+    assert intervals[1] < intervals[2]
+
+
+def test_zero_budget_plans_the_maximum_interval():
+    profiles = [_profile(1, 5), _profile(2, 2000)]
+    # Never below the requested interval, even above the cap
+    assert plan_intervals(profiles, budget_per_hour=0) == {1: PLANNER_MAX_INTERVAL_MINUTES, 2: 2000}
+
+
+def test_stretched_intervals_are_capped(monkeypatch):
+    monkeypatch.setattr(planner, "PLANNER_MAX_INTERVAL_MINUTES", 120)
+    # 0.5 queries/h would mean a 360 minute interval
+    assert plan_intervals([_profile(1, 5)], budget_per_hour=0.5) == {1: 120}
+
+
+@pytest.fixture
+def planner_db(tmp_path, monkeypatch):
+    """Empty core database for plan_profiles, apart from the suite's shared one"""
+    db_engine = create_engine(f"sqlite:///{tmp_path / 'planner.db'}")
+    SQLModel.metadata.create_all(db_engine, tables=[InstagramAccount.__table__, Profile.__table__, Post.__table__])
+    monkeypatch.setattr(planner, "engine", db_engine)
+    monkeypatch.setattr(planner, "request_budget", lambda session: 100)
+    monkeypatch.setattr(planner, "CRITICAL_BUDGET_SHARE", 0.3)
+    
+    def add(username: str, check_interval: int, slo_minutes=None) -> int:
+        with Session(db_engine) as session:
+            profile = Profile(username=username, webhook_url="", check_interval=check_interval,
+                              slo_minutes=slo_minutes, avg_requests_per_run=3.0)
+            session.add(profile)
+            session.commit()
+            return profile.id
+    
+    return db_engine, add
+
+
+def test_critical_lane_keeps_its_share_when_standard_is_over_budget(planner_db):
+    db_engine, add = planner_db
+    critical = add("critical", check_interval=30, slo_minutes=1)
+    standard = add("standard", check_interval=1)
+    
+    plans = plan_profiles()
+    # 30 of 100 queries/h for the critical profile, the other 70 for standard
+    assert plans[critical] == {"interval": 6, "requested": 1, "lane": "critical", "target": 1}
+    assert plans[standard] == {"interval": 3, "requested": 1, "lane": "standard", "target": 3}
+    with Session(db_engine) as session:
+        assert session.get(Profile, critical).planned_interval == 6
+
+
+def test_critical_lane_takes_what_standard_does_not_need(planner_db):
+    _, add = planner_db
+    critical = add("critical", check_interval=30, slo_minutes=1)
+    standard = add("standard", check_interval=60)
+    
+    plans = plan_profiles()
+    # Standard needs 3 queries/h: the critical floor of 30 grows to 97
+    assert plans[critical]["interval"] == 2
+    assert plans[standard]["interval"] == 60
+
+
+def test_standard_lane_gets_what_critical_leaves(planner_db):
+    _, add = planner_db
+    critical = add("critical", check_interval=30, slo_minutes=30)
+    standard = add("standard", check_interval=1)
+    
+    plans = plan_profiles()
+    # Critical uses 6 queries/h of its 30: standard gets 94, not 70
+    assert plans[critical]["interval"] == 30
+    assert plans[standard]["interval"] == 2
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app import scheduler as scheduler_module
+from app.database import Session, engine
+from app.main import scheduler
+from app.models import JobSchedule
+from app.scheduler import TaskScheduler
+
+
+def test_concurrent_profile_updates_keep_one_job(client, monkeypatch):
+    response = client.post("/api/profiles", json={"username": "concurrent_profile", "webhook_url": "http://localhost/hook"})
+    profile_id = response.json()["id"]
+    
+    # Widen the window between removing the old job and adding the new one
+    remove_job = scheduler.scheduler.remove_job
+    
+    def slow_remove_job(job_id, *args, **kwargs):
+        remove_job(job_id, *args, **kwargs)
+        time.sleep(0.02)
+    
+    monkeypatch.setattr(scheduler.scheduler, "remove_job", slow_remove_job)
+    
+    def update(interval: int) -> int:
+        return client.put(f"/api/profiles/{profile_id}", json={"check_interval": interval}).status_code
+    
+    with ThreadPoolExecutor(8) as pool:
+        statuses = list(pool.map(update, [30 + i % 5 for i in range(40)]))
+    assert statuses == [200] * 40
+    assert [job.id for job in scheduler.scheduler.get_jobs()].count(f"profile_{profile_id}") == 1
+    
+    assert client.delete(f"/api/profiles/{profile_id}").status_code == 200
+    assert scheduler.scheduler.get_job(f"profile_{profile_id}") is None
+
+
+def test_scraper_thread_is_released_when_the_loop_stops(monkeypatch):
+    monkeypatch.setattr(scheduler_module, "PIPELINE_QUEUE_SIZE", 1)
+    tasks = TaskScheduler("http://localhost")
+    
+    async def never_deliver(profile_id, items, lane):
+        await asyncio.Event().wait()
+    
+    monkeypatch.setattr(tasks, "_deliver", never_deliver)
+    scrape_done = threading.Event()
+    errors = []
+    
+    def scrape(on_media):
+        try:
+            for index in range(5):
+                on_media([{"id": index}])
+        except RuntimeError as e:
+            errors.append(e)
+        finally:
+            scrape_done.set()
+    
+    loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    loop_thread.start()
+    try:
+        asyncio.run_coroutine_threadsafe(tasks._run_pipeline(1, scrape, "standard"), loop)
+        
+        # One item is being delivered, one waits in the queue, the third put blocks
+        assert not scrape_done.wait(0.5)
+        loop.call_soon_threadsafe(loop.stop)
+        assert scrape_done.wait(5)
+        assert errors
+    finally:
+        if loop.is_running():  # The test failed before stopping it
+            loop.call_soon_threadsafe(loop.stop)
+        loop_thread.join(5)
+        # The pipeline's cleanup waits on the full queue, so keep cancelling
+        # until every task is gone
+        while pending := asyncio.all_tasks(loop):
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.wait(pending, timeout=1))
+        loop.close()
+        tasks.stop()
+
+
+def test_failed_scrape_marks_the_run_failed(monkeypatch):
+    tasks = TaskScheduler("http://localhost")
+    
+    async def failing_pipeline(profile_id, scrape, lane):
+        raise RuntimeError("instagram down")
+    
+    recorded = []
+    monkeypatch.setattr(tasks, "_run_pipeline", failing_pipeline)
+    monkeypatch.setattr(tasks, "_log", lambda *args: None)
+    monkeypatch.setattr(tasks, "_record_run", lambda run: recorded.append(run["status"]))
+    
+    run = {"profile_id": 1, "status": "running"}
+    asyncio.run(tasks._execute_run(run))
+    assert run["status"] == "failed"
+    assert recorded == ["failed"]
+    tasks.stop()
+
+
+def test_stop_before_profiles_load_keeps_saved_timers(client):
+    next_run = datetime.utcnow() + timedelta(minutes=20)
+    with Session(engine) as session:
+        session.merge(JobSchedule(job_id="profile_999", next_run_time=next_run, updated_at=datetime.utcnow()))
+        session.commit()
+    
+    async def start_and_stop():
+        # Startup interrupted before _load_all_profiles added any job
+        tasks = TaskScheduler("http://localhost")
+        tasks.scheduler.start()
+        tasks.stop()
+    
+    asyncio.run(start_and_stop())
+    with Session(engine) as session:
+        assert session.get(JobSchedule, "profile_999").next_run_time == next_run
@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+
+from app.database import Session, engine
+from app.models import ScrapeRun
+
+
+def test_slo_stats_report_lane_and_target_of_the_latest_run(client):
+    now = datetime.utcnow()
+    runs = [
+        # The worst overshoot, before the profile was moved to the critical lane
+        ("standard", 30, 600.0, now - timedelta(hours=2)),
+        ("standard", 30, 0.0, now - timedelta(hours=1)),
+        ("critical", 5, 0.0, now - timedelta(minutes=5)),
+    ]
+    with Session(engine) as session:
+        for lane, target, late, started_at in runs:
+            session.add(ScrapeRun(profile_id=4242, lane=lane, trigger="scheduled", status="completed",
+                                  target_minutes=target, late_seconds=late, started_at=started_at,
+                                  finished_at=started_at))
+        session.commit()
+    
+    stats = client.get("/api/stats/slo", params={"profile_id": 4242}).json()
+    assert len(stats) == 1
+    assert stats[0]["lane"] == "critical" and stats[0]["target_minutes"] == 5
+    assert stats[0]["runs"] == 3 and stats[0]["max_late_seconds"] == 600.0
+    assert stats[0]["attainment"] == 2 / 3
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+import httpx
+
+from app import main
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.started = False
+    
+    async def start(self):
+        self.started = True
+
+
+def test_health_answers_while_the_database_migrates(monkeypatch):
+    migrating = threading.Event()
+    release = threading.Event()
+    
+    def create_db_and_tables():
+        migrating.set()
+        release.wait(10)
+    
+    fake_scheduler = FakeScheduler()
+    monkeypatch.setattr(main, "create_db_and_tables", create_db_and_tables)
+    monkeypatch.setattr(main.stats_tracker, "load", lambda: None)
+    monkeypatch.setattr(main, "scheduler", fake_scheduler)
+    monkeypatch.setattr(main, "warm_scraper", lambda: None)
+    monkeypatch.setattr(main.log_hub, "attach_loop", lambda loop: None)
+    monkeypatch.setattr(main, "_startup_task", None)
+    monkeypatch.setitem(main.startup_state, "status", "pending")
+    monkeypatch.setitem(main.startup_state, "error", None)
+    
+    async def scenario():
+        # The hook returns (so the server can accept connections) before migrating
+        await asyncio.wait_for(main.startup_event(), timeout=1)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            assert await asyncio.get_running_loop().run_in_executor(None, migrating.wait, 5)
+            health = await asyncio.wait_for(http.get("/health"), timeout=1)
+            assert health.status_code == 200
+            ready = await http.get("/ready")
+            assert ready.status_code == 503
+            assert ready.json()["checks"]["database"] == "pending"
+            
+            release.set()
+            await main._startup_task
+            ready = await http.get("/ready")
+            assert ready.json()["checks"]["database"] == "ready"
+        assert fake_scheduler.started
+    
+    asyncio.run(scenario())
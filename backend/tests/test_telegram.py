@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from app import telegram
+from app.telegram import TelegramManager, group_media
+
+
+class BotApiStub(ThreadingHTTPServer):
+    """Local stand-in for the Bot API: records calls, answers like Telegram.
+    
+    ``rate_limited`` chats get one 429 with ``retry_after`` before succeeding.
+    """
+    
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), BotApiHandler)
+        self.calls = []
+        self.rate_limited = {}  # chat_id -> retry_after
+        self.lock = threading.Lock()
+        self.next_file_id = 0
+    
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+    
+    def file_id(self) -> str:
+        with self.lock:
+            self.next_file_id += 1
+            return f"file-{self.next_file_id}"
+
+
+class BotApiHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+    
+    def _parse(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        content_type = self.headers["Content-Type"]
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode() + body
+            )
+            fields, files = {}, []
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                if part.get_filename():
+                    files.append(name)
+                else:
+                    fields[name] = part.get_content()
+            return fields, files
+        return {key: values[0] for key, values in parse_qs(body.decode()).items()}, []
+    
+    def _reply(self, status: int, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def do_POST(self):
+        stub = self.server
+        method = self.path.rsplit("/", 1)[-1]
+        fields, files = self._parse()
+        chat_id = fields["chat_id"]
+        with stub.lock:
+            stub.calls.append({"method": method, "chat_id": chat_id, "fields": fields, "files": files})
+            retry_after = stub.rate_limited.pop(chat_id, None)
+        if retry_after is not None:
+            self._reply(429, {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                              "parameters": {"retry_after": retry_after}})
+            return
+        
+        if method == "sendMediaGroup":
+            entries = json.loads(fields["media"])
+        else:
+            kind = "video" if method == "sendVideo" else "photo"
+            entries = [{"type": kind, "media": fields.get(kind, "attach://upload")}]
+        messages = []
+        for entry in entries:
+            # Reused files keep their id, like Telegram does
+            file_id = entry["media"] if not entry["media"].startswith("attach://") else stub.file_id()
+            if entry["type"] == "video":
+                messages.append({"message_id": len(stub.calls), "video": {"file_id": file_id}})
+            else:
+                messages.append({"message_id": len(stub.calls), "photo": [{"file_id": "small"}, {"file_id": file_id}]})
+        self._reply(200, {"ok": True, "result": messages if method == "sendMediaGroup" else messages[0]})
+
+
+@pytest.fixture
+def bot_api(monkeypatch):
+    monkeypatch.setattr(telegram, "TELEGRAM_CHAT_INTERVAL", 0.05)
+    stub = BotApiStub()
+    thread = threading.Thread(target=stub.serve_forever, daemon=True)
+    thread.start()
+    yield stub
+    stub.shutdown()
+    stub.server_close()
+
+
+def _carousel(tmp_path, count: int, post_id: int = 1):
+    items = []
+    for index in range(count):
+        path = tmp_path / f"{post_id}_{index:02d}.jpg"
+        path.write_bytes(b"\xff\xd8 fake jpeg")
+        items.append({
+            "id": index + 1,
+            "post_id": post_id,
+            "type": "post",
+            "caption": "Legenda",
+            "timestamp": "2024-06-01T00:00:00",
+            "media_path": str(path),
+            "media_type": "image",
+            "instagram_id": f"shortcode{post_id}",
+        })
+    return items
+
+
+def test_carousel_is_sent_as_media_groups_of_ten(bot_api, tmp_path):
+    manager = TelegramManager("TOKEN", bot_api.url)
+    groups = group_media(_carousel(tmp_path, 12) + _carousel(tmp_path, 1, post_id=2))
+    assert [len(group) for group in groups] == [10, 2, 1]
+    
+    assert all(manager.send_group("100", group) for group in groups)
+    assert [call["method"] for call in bot_api.calls] == ["sendMediaGroup", "sendMediaGroup", "sendPhoto"]
+    first = bot_api.calls[0]
+    assert len(first["files"]) == 10
+    media = json.loads(first["fields"]["media"])
+    assert media[0]["caption"] == "Legenda" and "caption" not in media[1]
+    assert bot_api.calls[2]["files"] == ["photo"]
+
+
+def test_rate_limited_message_is_requeued_after_retry_after(bot_api, tmp_path):
+    manager = TelegramManager("TOKEN", bot_api.url)
+    bot_api.rate_limited["200"] = 1
+    
+    started = time.monotonic()
+    assert manager.send_group("200", _carousel(tmp_path, 1))
+    assert time.monotonic() - started >= 1
+    assert [call["chat_id"] for call in bot_api.calls] == ["200", "200"]
+
+
+def test_uploaded_files_are_reused_by_file_id_in_other_chats(bot_api, tmp_path):
+    manager = TelegramManager("TOKEN", bot_api.url)
+    group = _carousel(tmp_path, 3)
+    
+    assert manager.send_group("100", group)
+    assert manager.send_group("300", group)
+    first, second = bot_api.calls
+    assert len(first["files"]) == 3 and second["files"] == []
+    assert [entry["media"] for entry in json.loads(second["fields"]["media"])] == ["file-1", "file-2", "file-3"]
@@ -156,6 +156,17 @@ export default function Config() {
                         required
                       />
                     </div>
+                    <div className="space-y-2">
+                      <Label htmlFor="telegram_chat_id">Chat(s) do Telegram (opcional)</Label>
+                      <Input
+                        id="telegram_chat_id"
+                        placeholder="-1001234567890, 123456789"
+                        value={formData.telegram_chat_id ?? ''}
+                        onChange={(e) =>
+                          setFormData({ ...formData, telegram_chat_id: e.target.value })
+                        }
+                      />
+                    </div>
                   </div>
 
                   <div className="space-y-2">
@@ -181,6 +192,54 @@ export default function Config() {
                     </Select>
                   </div>
 
+                  <div className="space-y-2">
+                    <Label htmlFor="priority">Prioridade</Label>
+                    <Select
+                      value={(formData.priority ?? 1).toString()}
+                      onValueChange={(value) =>
+                        setFormData({
+                          ...formData,
+                          priority: parseInt(value),
+                        })
+                      }
+                    >
+                      <SelectTrigger>
+                        <SelectValue />
+                      </SelectTrigger>
+                      <SelectContent>
+                        <SelectItem value="1">Normal</SelectItem>
+                        <SelectItem value="3">Alta</SelectItem>
+                        <SelectItem value="5">Máxima</SelectItem>
+                      </SelectContent>
+                    </Select>
+                    <p className="text-sm text-muted-foreground">
+                      Se o limite de requisições do Instagram for atingido, perfis de menor prioridade são checados com menos frequência
+                    </p>
+                  </div>
+
+                  <div className="space-y-2">
+                    <Label htmlFor="slo_minutes">Tempo máximo de detecção (SLO)</Label>
+                    <Select
+                      value={(formData.slo_minutes ?? 0).toString()}
+                      onValueChange={(value) =>
+                        setFormData({
+                          ...formData,
+                          slo_minutes: parseInt(value) || null,
+                        })
+                      }
+                    >
+                      <SelectTrigger>
+                        <SelectValue />
+                      </SelectTrigger>
+                      <SelectContent>
+                        <SelectItem value="0">Sem SLO</SelectItem>
+                        <SelectItem value="2">2 minutos</SelectItem>
+                        <SelectItem value="5">5 minutos</SelectItem>
+                        <SelectItem value="15">15 minutos</SelectItem>
+                      </SelectContent>
+                    </Select>
+                  </div>
+
                   <div className="flex gap-6">
                     <div className="flex items-center space-x-2">
                       <Switch
@@ -243,7 +302,14 @@ export default function Config() {
                         <TableCell className="max-w-xs truncate">
                           {profile.webhook_url}
                         </TableCell>
-                        <TableCell>{profile.check_interval} min</TableCell>
+                        <TableCell>
+                          {profile.check_interval} min
+                          {profile.planned_interval && profile.planned_interval > profile.check_interval && (
+                            <span className="block text-xs text-muted-foreground">
+                              planejado: {profile.planned_interval} min
+                            </span>
+                          )}
+                        </TableCell>
                         <TableCell>
                           {profile.download_posts ? '✓' : '✗'}
                         </TableCell>
@@ -7,7 +7,7 @@ import { Label } from '@/components/ui/label'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
 import { useToast } from '@/hooks/use-toast'
 import { Loader2, User, Check, X, Plus, Trash2, Eye, EyeOff } from 'lucide-react'
-import api from '@/lib/api'
+import api, { jobsApi, JobStarted } from '@/lib/api'
 import { Dialog, DialogContent, DialogDescription, DialogFooter, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog'
 import { Badge } from '@/components/ui/badge'
 
@@ -115,11 +115,18 @@ export default function InstagramAccountsPage() {
 
     setTestingLogin(account.id)
     try {
-      const response = await api.post(`/api/instagram-accounts/${account.id}/test-login`, null, {
+      const response = await api.post<JobStarted>(`/api/instagram-accounts/${account.id}/test-login`, null, {
         params: { password: testPassword }
       })
+      const job = await jobsApi.wait<{ success: boolean; message: string }>(response.data.job_id)
       
-      if (response.data.success) {
+      if (job.status === 'failed') {
+        toast({
+          title: 'Error',
+          description: `Login failed: ${job.error}`,
+          variant: 'destructive'
+        })
+      } else if (job.result?.success) {
         toast({
           title: 'Success',
           description: 'Login successful! Session saved for future use.'
@@ -128,7 +135,7 @@ export default function InstagramAccountsPage() {
       } else {
         toast({
           title: 'Error',
-          description: response.data.message || 'Login failed',
+          description: job.result?.message || 'Login failed',
           variant: 'destructive'
         })
       }
@@ -1,20 +1,48 @@
 'use client';
 
-import { useQuery } from '@tanstack/react-query';
+import { useEffect } from 'react';
+import { useQuery, useQueryClient } from '@tanstack/react-query';
 import { Activity, Instagram, Send, AlertCircle } from 'lucide-react';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
-import { statsApi } from '@/lib/api';
+import { statsApi, createDashboardSocket, Stats, ProfileStatus } from '@/lib/api';
 import { Navigation } from '@/components/navigation';
 
 export default function Dashboard() {
+  const queryClient = useQueryClient();
+  
   const { data: stats, isLoading } = useQuery({
     queryKey: ['stats'],
     queryFn: async () => {
       const response = await statsApi.get();
       return response.data;
     },
-    refetchInterval: 30000, // Refresh every 30 seconds
+    staleTime: Infinity, // Kept current by the dashboard WebSocket
   });
+  
+  // Apply pushed stats deltas and profile status changes to the query cache
+  useEffect(() => {
+    const socket = createDashboardSocket({
+      onSnapshot: (snapshot, profiles) => {
+        queryClient.setQueryData(['stats'], snapshot);
+        queryClient.setQueryData(['profile-status'], profiles);
+      },
+      onStats: (delta) => {
+        queryClient.setQueryData<Stats>(['stats'], (old) => old ? { ...old, ...delta } : old);
+      },
+      onProfileStatus: (status) => {
+        queryClient.setQueryData<Record<string, ProfileStatus>>(['profile-status'], (old) => {
+          const next = { ...(old || {}) };
+          if (status.deleted) {
+            delete next[status.profile_id];
+          } else {
+            next[status.profile_id] = status;
+          }
+          return next;
+        });
+      },
+    });
+    return () => socket.close();
+  }, [queryClient]);
 
   return (
     <>
@@ -12,7 +12,14 @@ export interface Profile {
   id: number;
   username: string;
   webhook_url: string;
+  telegram_chat_id?: string;
   check_interval: number;
+  priority: number;
+  // Detection target in minutes; profiles with one use the critical lane
+  slo_minutes?: number | null;
+  // Interval actually scheduled within the Instagram request budget
+  planned_interval?: number;
+  avg_requests_per_run?: number;
   download_posts: boolean;
   download_stories: boolean;
   is_active: boolean;
@@ -25,14 +32,24 @@ export interface Profile {
 export interface ProfileCreate {
   username: string;
   webhook_url: string;
+  // Comma-separated Telegram chat ids, sent by the built-in bot
+  telegram_chat_id?: string;
   check_interval: number;
+  // Weight in the request budget; higher stays closer to check_interval
+  priority?: number;
+  slo_minutes?: number | null;
   download_posts: boolean;
   download_stories: boolean;
+  // latest: recent feed pages, now: no history, full: chunked backfill
+  history?: 'latest' | 'now' | 'full';
 }
 
 export interface ProfileUpdate {
   webhook_url?: string;
+  telegram_chat_id?: string;
   check_interval?: number;
+  priority?: number;
+  slo_minutes?: number | null;
   download_posts?: boolean;
   download_stories?: boolean;
   is_active?: boolean;
@@ -48,6 +65,73 @@ export interface SystemLog {
   created_at: string;
 }
 
+// Destination types
+export type MediaVariant = 'preview' | 'thumb';
+
+export interface Destination {
+  id: number;
+  profile_id: number;
+  kind: 'webhook' | 'telegram';
+  target: string;
+  is_active: boolean;
+  variant?: MediaVariant;
+  last_status?: 'ok' | 'partial' | 'failed';
+  last_error?: string;
+  last_latency_ms?: number;
+  last_delivery_at?: string;
+  sent_count: number;
+  failed_count: number;
+  created_at: string;
+}
+
+export interface DestinationCreate {
+  kind: 'webhook' | 'telegram';
+  target: string;
+  is_active?: boolean;
+  variant?: MediaVariant | null;
+}
+
+// Media types
+export interface MediaItem {
+  id: number;
+  post_id: number;
+  profile_id: number;
+  media_type: 'post' | 'story';
+  instagram_id: string;
+  media_path: string;
+  file_type: 'image' | 'video';
+  size_bytes?: number;
+  timestamp: string;
+  webhook_sent: boolean;
+  sent_at?: string;
+  caption?: string;
+}
+
+export interface MediaPage {
+  items: MediaItem[];
+  next_cursor: string | null;
+}
+
+export interface MediaSummary {
+  profile_id: number;
+  total: number;
+  posts: number;
+  stories: number;
+  pending: number;
+  last_timestamp?: string;
+}
+
+export interface MediaListParams {
+  profile_id?: number;
+  media_type?: 'post' | 'story';
+  since?: string;
+  until?: string;
+  webhook_sent?: boolean;
+  include_caption?: boolean;
+  cursor?: string;
+  limit?: number;
+}
+
 // Stats types
 export interface Stats {
   total_profiles: number;
@@ -58,6 +142,30 @@ export interface Stats {
   last_check?: string;
 }
 
+export interface SloStats {
+  profile_id: number;
+  lane: 'critical' | 'standard';
+  target_minutes: number;
+  runs: number;
+  met: number;
+  attainment: number | null;
+  avg_late_seconds: number;
+  max_late_seconds: number;
+  last_run_at: string;
+}
+
+export interface ProfileStatus {
+  profile_id: number;
+  username?: string;
+  is_active?: boolean;
+  last_check?: string | null;
+  last_item?: string | null;
+  last_error?: string | null;
+  webhooks_sent?: number;
+  webhooks_failed?: number;
+  deleted?: boolean;
+}
+
 // API functions
 export interface TestResult {
   profile: string;
@@ -92,6 +200,40 @@ export interface TestResult {
   warning?: string;
 }
 
+// Background jobs (test scraping, Instagram login)
+export interface Job<T = unknown> {
+  job_id: string;
+  kind: string;
+  status: 'queued' | 'running' | 'completed' | 'failed';
+  steps: TestResult['steps'];
+  result: T | null;
+  error: string | null;
+  created_at: string;
+  started_at?: string | null;
+  finished_at?: string | null;
+}
+
+export interface JobStarted {
+  job_id: string;
+  status: string;
+  deduplicated: boolean;
+}
+
+export const jobsApi = {
+  get: <T,>(jobId: string) => api.get<Job<T>>(`/api/jobs/${jobId}`),
+  // Poll until the job finishes; onProgress receives every intermediate state
+  wait: async <T,>(jobId: string, onProgress?: (job: Job<T>) => void, intervalMs = 1000): Promise<Job<T>> => {
+    for (;;) {
+      const { data: job } = await jobsApi.get<T>(jobId);
+      onProgress?.(job);
+      if (job.status === 'completed' || job.status === 'failed') {
+        return job;
+      }
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+  },
+};
+
 export const profilesApi = {
   list: () => api.get<Profile[]>('/api/profiles'),
   create: (data: ProfileCreate) => api.post<Profile>('/api/profiles', data),
@@ -101,9 +243,13 @@ export const profilesApi = {
   forceCheck: (id: number) => api.post(`/api/check/${id}`),
   testScraping: (id: number) => {
     console.log(`🧪 [TEST] Iniciando teste de scraping para perfil ID: ${id}`);
-    return api.post<TestResult>(`/api/test/${id}`).then(response => {
-      console.log('✅ [TEST] Resposta recebida:', response.data);
-      return response;
+    return api.post<JobStarted>(`/api/test/${id}`).then(async response => {
+      const job = await jobsApi.wait<TestResult>(response.data.job_id);
+      if (job.status === 'failed' || !job.result) {
+        throw new Error(job.error || 'Test job failed');
+      }
+      console.log('✅ [TEST] Resposta recebida:', job.result);
+      return { ...response, data: job.result };
     }).catch(error => {
       console.error('❌ [TEST] Erro no teste:', error);
       throw error;
@@ -116,27 +262,127 @@ export const logsApi = {
     api.get<SystemLog[]>('/api/logs', { params }),
 };
 
+export const destinationsApi = {
+  list: (profileId: number) => api.get<Destination[]>(`/api/profiles/${profileId}/destinations`),
+  create: (profileId: number, data: DestinationCreate) =>
+    api.post<Destination>(`/api/profiles/${profileId}/destinations`, data),
+  update: (id: number, data: { target?: string; is_active?: boolean; variant?: MediaVariant | null }) =>
+    api.put<Destination>(`/api/destinations/${id}`, data),
+  delete: (id: number) => api.delete(`/api/destinations/${id}`),
+};
+
+export const mediaApi = {
+  list: (params?: MediaListParams) => api.get<MediaPage>('/api/media', { params }),
+  summary: (params?: { profile_id?: number; since?: string; until?: string }) =>
+    api.get<MediaSummary[]>('/api/media/summary', { params }),
+};
+
 export const statsApi = {
   get: () => api.get<Stats>('/api/stats'),
+  slo: (params?: { profile_id?: number; lane?: string; since?: string }) =>
+    api.get<SloStats[]>('/api/stats/slo', { params }),
 };
 
 // WebSocket connection for real-time logs
+// Reconnects automatically, resuming from the last cursor so no log is lost
 export const createWebSocket = (onMessage: (log: SystemLog) => void) => {
-  const wsUrl = process.env.NEXT_PUBLIC_WS_URL || 
+  const baseUrl = process.env.NEXT_PUBLIC_WS_URL || 
     (typeof window !== 'undefined' 
       ? `${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//${window.location.host}/api/ws/logs`
       : 'ws://localhost:8000/ws/logs');
   
-  const ws = new WebSocket(wsUrl);
+  let cursor: number | null = null;
+  let closed = false;
+  let ws: WebSocket;
   
-  ws.onmessage = (event) => {
-    const data = JSON.parse(event.data);
-    if (data.type === 'log') {
-      onMessage(JSON.parse(data.data));
-    }
+  const connect = () => {
+    const wsUrl = cursor !== null ? `${baseUrl}?since_id=${cursor}` : baseUrl;
+    ws = new WebSocket(wsUrl);
+    
+    ws.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      // Logs arrive in batches: { type: 'batch', events: [{ type: 'log', data }], cursor, dropped? }
+      if (data.type === 'batch') {
+        data.events.forEach((item: { type: string; data: SystemLog }) => {
+          if (item.type === 'log') {
+            onMessage(item.data);
+          }
+        });
+      }
+      if (typeof data.cursor === 'number') {
+        cursor = data.cursor;
+      }
+    };
+    
+    ws.onclose = () => {
+      if (!closed) {
+        setTimeout(connect, 3000);
+      }
+    };
+  };
+  
+  connect();
+  
+  return {
+    close: () => {
+      closed = true;
+      ws.close();
+    },
+  };
+};
+
+// WebSocket with pushed dashboard state (replaces polling /api/stats)
+export const createDashboardSocket = (handlers: {
+  onSnapshot: (stats: Stats, profiles: Record<string, ProfileStatus>) => void;
+  onStats: (delta: Partial<Stats>) => void;
+  onProfileStatus: (status: ProfileStatus) => void;
+}) => {
+  const wsUrl = process.env.NEXT_PUBLIC_WS_URL
+    ? process.env.NEXT_PUBLIC_WS_URL.replace(/\/ws\/logs$/, '/ws/dashboard')
+    : (typeof window !== 'undefined'
+      ? `${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//${window.location.host}/api/ws/dashboard`
+      : 'ws://localhost:8000/ws/dashboard');
+  
+  let closed = false;
+  let ws: WebSocket;
+  
+  const connect = () => {
+    ws = new WebSocket(wsUrl);
+    
+    ws.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (data.type === 'snapshot') {
+        handlers.onSnapshot(data.stats, data.profiles);
+      } else if (data.type === 'batch') {
+        data.events.forEach((item: { type: string; data: Partial<Stats> & ProfileStatus }) => {
+          if (item.type === 'stats') {
+            handlers.onStats(item.data);
+          } else if (item.type === 'profile_status') {
+            handlers.onProfileStatus(item.data);
+          }
+        });
+        // Missed events: reconnect to get a fresh snapshot
+        if (data.dropped) {
+          ws.close();
+        }
+      }
+    };
+    
+    ws.onclose = () => {
+      if (!closed) {
+        setTimeout(connect, 3000);
+      }
+    };
   };
   
-  return ws;
+  connect();
+  
+  return {
+    close: () => {
+      closed = true;
+      ws.close();
+    },
+  };
 };
 
 // Default export for convenience